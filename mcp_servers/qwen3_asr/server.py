@@ -21,7 +21,6 @@ from contextlib import asynccontextmanager
 from pathlib import Path
 
 import torch
-import uvicorn
 from fastapi import FastAPI, File, HTTPException, UploadFile
 from fastapi.responses import JSONResponse
 from qwen_asr import Qwen3ASRModel
@@ -163,4 +162,16 @@ async def transcribe(audio: UploadFile = File(...)) -> JSONResponse:
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8086, log_level="info")
+    # Only needed when run as a script — the Dockerfile launches via the uvicorn CLI.
+    import uvicorn
+
+    # uvicorn[standard] ships uvloop + httptools; pin them explicitly so a
+    # missing extra fails loudly instead of silently falling back to asyncio.
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8086,
+        log_level="info",
+        loop="uvloop",
+        http="httptools",
+    )
@@ -9,27 +9,47 @@ import logging
 from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Any, Literal
 
+# Agent and RunContext stay at module scope: PydanticAI resolves the tool
+# annotations (RunContext[AgentDeps]) against this module's globals.
 from pydantic_ai import Agent, RunContext
-from telegram import Bot
 
-from home_agent.config import AppConfig
-from home_agent.history import HistoryManager, sliding_window_processor
-from home_agent.profile import ProfileManager, UserProfile
+from home_agent.history import HISTORY_WINDOW_PAIRS, sliding_window_processor
+from home_agent.profile import SUPPORTED_LANGUAGES
 from home_agent.prompts import SYSTEM_PROMPT
-from home_agent.tools.profile_tools import (
-    set_confirmation_mode,
-    set_movie_quality,
-    set_reply_language,
-    set_series_quality,
-)
-from home_agent.tools.telegram_tools import send_confirmation_keyboard, send_poster_image
 
 if TYPE_CHECKING:
+    from telegram import Bot
+
+    from home_agent.config import AppConfig
+    from home_agent.history import HistoryManager
     from home_agent.mcp.guarded_toolset import GuardedToolset
+    from home_agent.profile import ProfileManager, UserProfile
 
 logger = logging.getLogger(__name__)
 
 
+def _reply_language_line(language: str) -> str:
+    """Render the reply-language line of the user context prompt.
+
+    Args:
+        language: Human-readable language name.
+
+    Returns:
+        The prompt line instructing the agent to reply in that language.
+    """
+    return f"Reply language: {language} — always use this language."
+
+
+# Built once at import for the languages new profiles are seeded with. Languages
+# set later via set_reply_language fall back to _reply_language_line().
+_REPLY_LANGUAGE_LINES: dict[str, str] = {
+    language: _reply_language_line(language) for language in SUPPORTED_LANGUAGES
+}
+
+_NOTES_PREFIX = "Notes about this user: "
+_NOTES_SEPARATOR = "; "
+
+
 @dataclass
 class RetryConfig:
     """Configuration for exponential backoff retry behavior.
@@ -38,14 +58,22 @@ class RetryConfig:
         max_retries: Maximum number of retries on HTTP 429 rate limit errors.
         base_delay: Base delay in seconds for exponential backoff. Doubles each retry.
         max_delay: Maximum delay in seconds for exponential backoff. Caps the doubling.
+        max_total_wait: Maximum total backoff sleep in seconds per model request.
+        requests_per_minute: Client-side request rate cap applied before each
+            model request. 0 disables pacing.
+        max_concurrent_requests: Cap on model requests in flight at once.
+            0 disables the cap.
     """
 
     max_retries: int = 3
     base_delay: float = 1.0
     max_delay: float = 30.0
+    max_total_wait: float = 30.0
+    requests_per_minute: float = 0.0
+    max_concurrent_requests: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentDeps:
     """Dependencies injected into the agent at runtime.
 
@@ -85,6 +113,128 @@ class AgentDeps:
     role: Literal["admin", "user", "read_only"] = "user"
 
 
+async def inject_user_profile(ctx: RunContext[AgentDeps]) -> str:
+    """Inject user profile into the system prompt dynamically.
+
+    Args:
+        ctx: Runtime context with dependencies.
+
+    Returns:
+        A string fragment appended to the system prompt before each request.
+    """
+    profile = ctx.deps.user_profile
+    prefs = profile.media_preferences
+
+    # This runs before every model request; skip rebuilding the block when
+    # nothing it depends on has changed since the last render. Notes are
+    # tracked by list identity, length and version (see notes_changed()), so
+    # the check stays O(1) however many notes there are.
+    notes_key = (len(profile.notes), profile._notes_version)
+    cache_key = (
+        profile.name,
+        profile.reply_language,
+        profile.confirmation_mode,
+        prefs.movie_quality,
+        prefs.series_quality,
+        notes_key,
+    )
+    cached = profile._prompt_cache
+    if cached is not None and cached[0] is profile.notes and cached[1] == cache_key:
+        return cached[2]
+
+    name_part = (
+        f"The user's name is {profile.name}."
+        if profile.name
+        else "The user has not set a name."
+    )
+
+    movie_q = (
+        prefs.movie_quality
+        if prefs.movie_quality
+        else "NOT SET — ask the user before making any movie request"
+    )
+    series_q = (
+        prefs.series_quality
+        if prefs.series_quality
+        else "NOT SET — ask the user before making any series request"
+    )
+
+    notes_part = ""
+    if profile.notes:
+        # Checked against the list object itself, not only the count:
+        # model_copy carries private attributes over, so a copy given a new
+        # notes list of the same length must not reuse this join. In-place
+        # edits bump the version via notes_changed().
+        cached_notes = profile._notes_joined
+        if (
+            cached_notes is not None
+            and cached_notes[0] is profile.notes
+            and cached_notes[1] == notes_key
+        ):
+            joined = cached_notes[2]
+        else:
+            joined = _NOTES_SEPARATOR.join(profile.notes)
+            profile._notes_joined = (profile.notes, notes_key, joined)
+        notes_part = _NOTES_PREFIX + joined
+
+    parts = [
+        "## Current User Context",
+        name_part,
+        _REPLY_LANGUAGE_LINES.get(profile.reply_language)
+        or _reply_language_line(profile.reply_language),
+        f"Confirmation mode: {profile.confirmation_mode}.",
+        f"Movie quality preference: {movie_q}.",
+        f"Series quality preference: {series_q}.",
+    ]
+    if notes_part:
+        parts.append(notes_part)
+
+    rendered = "\n".join(parts)
+    profile._prompt_cache = (profile.notes, cache_key, rendered)
+    return rendered
+
+
+async def update_user_note(ctx: RunContext[AgentDeps], note: str) -> str:
+    """Add an observation about the user to their profile.
+
+    Call this when you learn something meaningful about the user's preferences,
+    habits, or personality that would help you serve them better in future
+    conversations.
+
+    Args:
+        ctx: Runtime context with dependencies.
+        note: Free-form note about the user's preferences or behavior.
+
+    Returns:
+        Confirmation message.
+    """
+    profile = ctx.deps.user_profile
+    cached_notes = profile._notes_joined
+    joined = (
+        cached_notes[2]
+        if cached_notes is not None
+        and cached_notes[0] is profile.notes
+        and cached_notes[1] == (len(profile.notes), profile._notes_version)
+        else None
+    )
+    # Persist the updated copy before swapping it in, so a failed write leaves
+    # the run's profile as it was.
+    stored = await ctx.deps.profile_manager.append_note(
+        profile.model_copy(update={"notes": [*profile.notes, note]}), note
+    )
+    # Extend the joined form rather than rejoining every note on the next
+    # prompt render.
+    if joined is not None:
+        stored._notes_joined = (
+            stored.notes,
+            (len(stored.notes), stored._notes_version),
+            joined + _NOTES_SEPARATOR + note,
+        )
+    ctx.deps.user_profile = stored
+    logger.info("Added note to profile for user %s", profile.user_id)
+    return f"Noted: {note}"
+
+
 def create_agent(
     toolsets: list[Any] | None = None,
     model: str = "openrouter:qwen/qwq-32b:free",
@@ -103,7 +253,17 @@ def create_agent(
     Returns:
         Configured Agent instance with system prompt and tools registered.
     """
+    # Deferred so importing this module (e.g. for AgentDeps in bot.py and tests)
+    # does not pull in the model wrapper and tool modules until an agent is built.
+    from home_agent.models.rate_limit import TokenBucket
     from home_agent.models.retry_model import RetryingModel
+    from home_agent.tools.profile_tools import (
+        set_confirmation_mode,
+        set_movie_quality,
+        set_reply_language,
+        set_series_quality,
+    )
+    from home_agent.tools.telegram_tools import send_confirmation_keyboard, send_poster_image
 
     _retry_config = retry_config or RetryConfig()
     # Pass the model string directly so the provider (and its API-key check) is
@@ -113,86 +273,25 @@ def create_agent(
         max_retries=_retry_config.max_retries,
         base_delay=_retry_config.base_delay,
         max_delay=_retry_config.max_delay,
+        max_total_wait=_retry_config.max_total_wait,
+        rate_limiter=(
+            TokenBucket.per_minute(_retry_config.requests_per_minute)
+            if _retry_config.requests_per_minute > 0
+            else None
+        ),
+        max_concurrency=_retry_config.max_concurrent_requests or None,
     )
     agent_instance: Agent[AgentDeps, str] = Agent(
         retrying_model,
         deps_type=AgentDeps,
         defer_model_check=True,
         toolsets=toolsets or [],
-        history_processors=[sliding_window_processor(n=20)],
+        history_processors=[sliding_window_processor(n=HISTORY_WINDOW_PAIRS)],
         system_prompt=SYSTEM_PROMPT,
     )
 
-    @agent_instance.system_prompt(dynamic=True)
-    async def inject_user_profile(ctx: RunContext[AgentDeps]) -> str:
-        """Inject user profile into the system prompt dynamically.
-
-        Args:
-            ctx: Runtime context with dependencies.
-
-        Returns:
-            A string fragment appended to the system prompt before each request.
-        """
-        profile = ctx.deps.user_profile
-        prefs = profile.media_preferences
-
-        name_part = (
-            f"The user's name is {profile.name}."
-            if profile.name
-            else "The user has not set a name."
-        )
-
-        movie_q = (
-            prefs.movie_quality
-            if prefs.movie_quality
-            else "NOT SET — ask the user before making any movie request"
-        )
-        series_q = (
-            prefs.series_quality
-            if prefs.series_quality
-            else "NOT SET — ask the user before making any series request"
-        )
-
-        notes_part = (
-            "Notes about this user: " + "; ".join(profile.notes)
-            if profile.notes
-            else ""
-        )
-
-        parts = [
-            "## Current User Context",
-            name_part,
-            f"Reply language: {profile.reply_language} — always use this language.",
-            f"Confirmation mode: {profile.confirmation_mode}.",
-            f"Movie quality preference: {movie_q}.",
-            f"Series quality preference: {series_q}.",
-        ]
-        if notes_part:
-            parts.append(notes_part)
-
-        return "\n".join(parts)
-
-    @agent_instance.tool
-    async def update_user_note(ctx: RunContext[AgentDeps], note: str) -> str:
-        """Add an observation about the user to their profile.
-
-        Call this when you learn something meaningful about the user's preferences,
-        habits, or personality that would help you serve them better in future
-        conversations.
-
-        Args:
-            ctx: Runtime context with dependencies.
-            note: Free-form note about the user's preferences or behavior.
-
-        Returns:
-            Confirmation message.
-        """
-        profile = ctx.deps.user_profile
-        new_profile = profile.model_copy(update={"notes": [*profile.notes, note]})
-        ctx.deps.user_profile = new_profile
-        await ctx.deps.profile_manager.save(new_profile)
-        logger.info("Added note to profile for user %s", profile.user_id)
-        return f"Noted: {note}"
+    agent_instance.system_prompt(dynamic=True)(inject_user_profile)
+    agent_instance.tool(update_user_note)
 
     # Register profile preference tools
     agent_instance.tool(set_movie_quality)
@@ -6,36 +6,58 @@ Business logic lives in agent.py. This module is Telegram wiring only.
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import socket
 from collections.abc import Callable, Coroutine
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import httpx
 from pydantic_ai import Agent
 from pydantic_ai.exceptions import ModelHTTPError
 from telegram import Update
 from telegram.constants import ChatAction, ParseMode
-from telegram.ext import (
-    Application,
-    CallbackQueryHandler,
-    ContextTypes,
-    MessageHandler,
-    filters,
-)
-from telegram.request import HTTPXRequest
 
 from home_agent.agent import AgentDeps
 from home_agent.config import AppConfig
 from home_agent.formatting import md_to_telegram_html
-from home_agent.history import HistoryManager, convert_history_to_messages
+from home_agent.history import HISTORY_WINDOW_PAIRS, HistoryManager, convert_history_to_messages
 from home_agent.mcp.guarded_toolset import GuardedToolset
 from home_agent.profile import ProfileManager
 
+if TYPE_CHECKING:
+    from telegram.ext import Application, ContextTypes
+
 logger = logging.getLogger(__name__)
 
 _REJECTION_MESSAGE = "Sorry, you are not authorized to use this bot."
 
+# asyncio only keeps weak references to tasks; hold fire-and-forget tasks here
+# until they finish so they are not garbage-collected mid-flight.
+_background_tasks: set[asyncio.Task[Any]] = set()
+
+
+def _fire_and_forget(coro: Coroutine[Any, Any, Any]) -> None:
+    """Schedule a best-effort Telegram call without awaiting its result.
+
+    Args:
+        coro: The coroutine to run in the background.
+    """
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_task_done)
+
+
+def _on_background_task_done(task: asyncio.Task[Any]) -> None:
+    """Release a finished background task and log (rather than leak) its error.
+
+    Args:
+        task: The completed task.
+    """
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Background Telegram call failed", exc_info=task.exception())
+
 
 async def _invoke_agent(
     text: str,
@@ -71,12 +93,15 @@ async def _invoke_agent(
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id if update.effective_chat else None
 
-    # Load user profile, seeding language for new users from Telegram locale
+    # Load the user profile (seeding language for new users from the Telegram
+    # locale) and the conversation history concurrently — independent reads.
     language_code = update.effective_user.language_code
-    user_profile = await profile_manager.get(user_id, language_code=language_code)
+    user_profile, raw_history = await asyncio.gather(
+        profile_manager.get(user_id, language_code=language_code),
+        history_manager.get_history(user_id=user_id, limit=2 * HISTORY_WINDOW_PAIRS),
+    )
 
-    # Load and convert conversation history to PydanticAI ModelMessage objects
-    raw_history = await history_manager.get_history(user_id=user_id)
+    # Convert conversation history to PydanticAI ModelMessage objects
     message_history = convert_history_to_messages(raw_history)
 
     # Read and consume any pending confirmation from the inline keyboard
@@ -116,7 +141,8 @@ async def _invoke_agent(
     try:
         result = await agent.run(text, deps=deps, message_history=message_history)
         reply = result.output
-        logger.info("Agent output for user %d: %r", user_id, reply[:200] if reply else reply)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Agent output for user %d: %r", user_id, reply[:200] if reply else reply)
     except ModelHTTPError as exc:
         if exc.status_code == 429:
             logger.warning("Rate limit exhausted for user %d after retries", user_id)
@@ -147,14 +173,19 @@ async def _invoke_agent(
         )
         return
 
-    # Persist both turns
-    await history_manager.save_message(user_id=user_id, role="user", content=text)
-    await history_manager.save_message(user_id=user_id, role="assistant", content=reply)
+    async def _send_chunks() -> None:
+        # Chunks go out one at a time: Telegram does not order concurrent
+        # sends, and a long reply must arrive in sequence.
+        for chunk in _split_message(md_to_telegram_html(reply)):
+            await _send_reply(chunk, parse_mode=ParseMode.HTML)
 
-    html_reply = md_to_telegram_html(reply)
-    for chunk in _split_message(html_reply):
-        await _send_reply(chunk, parse_mode=ParseMode.HTML)
-    logger.debug("Sent agent reply to user %d", user_id)
+    # Persist both turns (one transaction) while the reply is being sent.
+    await asyncio.gather(
+        history_manager.save_turn(user_id=user_id, user_text=text, assistant_text=reply),
+        _send_chunks(),
+    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sent agent reply to user %d", user_id)
 
 
 def _split_message(text: str, max_length: int = 4096) -> list[str]:
@@ -171,30 +202,20 @@ def _split_message(text: str, max_length: int = 4096) -> list[str]:
     Returns:
         A list of string chunks, each at most max_length characters.
     """
+    # Greedy slicing: cut each chunk after the last newline that fits, or at
+    # max_length when a single line is longer than that.
     chunks: list[str] = []
-    current: list[str] = []
-    current_len = 0
-
-    for line in text.splitlines(keepends=True):
-        # If a single line is too long, flush current chunk and split the line
-        while len(line) > max_length:
-            if current:
-                chunks.append("".join(current))
-                current = []
-                current_len = 0
-            chunks.append(line[:max_length])
-            line = line[max_length:]
-
-        if current_len + len(line) > max_length:
-            chunks.append("".join(current))
-            current = []
-            current_len = 0
-
-        current.append(line)
-        current_len += len(line)
-
-    if current:
-        chunks.append("".join(current))
+    start = 0
+    text_len = len(text)
+    while start < text_len:
+        end = start + max_length
+        if end >= text_len:
+            chunks.append(text[start:])
+            break
+        newline = text.rfind("\n", start, end)
+        cut = newline + 1 if newline >= start else end
+        chunks.append(text[start:cut])
+        start = cut
 
     return chunks or [""]
 
@@ -236,6 +257,8 @@ def make_message_handler(
     _pending_confirmations: dict[int, tuple[int, str]] = (
         pending_confirmations if pending_confirmations is not None else {}
     )
+    # Snapshot the whitelist once so the per-message check is a hash lookup.
+    _allowed_ids: frozenset[int] = config.allowed_telegram_ids_set
 
     async def handle_message(
         update: Update, context: ContextTypes.DEFAULT_TYPE
@@ -249,22 +272,38 @@ def make_message_handler(
             update: The incoming Telegram update.
             context: The callback context provided by python-telegram-bot.
         """
-        if update.effective_user is None or update.message is None:
+        user = update.effective_user
+        message = update.message
+        if user is None or message is None:
             logger.warning("Received update with no user or message; ignoring.")
             return
 
-        user_id = update.effective_user.id
-        if user_id not in config.allowed_telegram_ids:
-            logger.info("Rejected unauthorized user %d", user_id)
-            await update.message.reply_text(_REJECTION_MESSAGE, parse_mode=ParseMode.HTML)
+        user_id = user.id
+        if user_id not in _allowed_ids:
+            # Can be high-volume scan traffic: one set lookup, one reply, and
+            # no log formatting unless debugging.
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Rejected unauthorized user %d", user_id)
+            await message.reply_text(
+                _REJECTION_MESSAGE, parse_mode=ParseMode.HTML, disable_notification=True
+            )
             return
 
-        logger.debug("Authorized user %d sent a message", user_id)
+        text = message.text or ""
+        if not text.strip():
+            # Nothing for the agent to answer; skip the typing call and the run.
+            # The text itself is passed on unstripped.
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Ignoring empty message from user %d", user_id)
+            return
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Authorized user %d sent a message", user_id)
 
+        # Don't block on the typing indicator — let it overlap with the agent run.
         if update.effective_chat is not None:
-            await update.effective_chat.send_action(action=ChatAction.TYPING)
+            _fire_and_forget(update.effective_chat.send_action(action=ChatAction.TYPING))
 
-        text = update.message.text or ""
         # Shared invocation path for text messages — handles profile loading, history,
         # agent execution, error handling, and reply formatting. Also used by voice and
         # callback handlers for consistency.
@@ -304,6 +343,7 @@ def make_voice_handler(
     """
     _guarded_toolsets: list[GuardedToolset] = guarded_toolsets or []
     _pending_confirmations: dict[int, tuple[int, str]] = pending_confirmations if pending_confirmations is not None else {}
+    _allowed_ids: frozenset[int] = config.allowed_telegram_ids_set
 
     async def handle_voice(
         update: Update, context: ContextTypes.DEFAULT_TYPE
@@ -324,9 +364,12 @@ def make_voice_handler(
         user_id = update.effective_user.id
 
         # Authorization check BEFORE any ASR call
-        if user_id not in config.allowed_telegram_ids:
-            logger.info("Rejected unauthorized voice user %d", user_id)
-            await update.message.reply_text(_REJECTION_MESSAGE, parse_mode=ParseMode.HTML)
+        if user_id not in _allowed_ids:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Rejected unauthorized voice user %d", user_id)
+            await update.message.reply_text(
+                _REJECTION_MESSAGE, parse_mode=ParseMode.HTML, disable_notification=True
+            )
             return
 
         voice = update.message.voice
@@ -339,9 +382,10 @@ def make_voice_handler(
             voice.duration,
         )
 
-        # Show typing indicator during download + transcription
+        # Show typing indicator during download + transcription without
+        # waiting on it before the download starts.
         if update.effective_chat is not None:
-            await update.effective_chat.send_action(action=ChatAction.TYPING)
+            _fire_and_forget(update.effective_chat.send_action(action=ChatAction.TYPING))
 
         try:
             # Download OGG voice file from Telegram
@@ -358,11 +402,12 @@ def make_voice_handler(
                 response.raise_for_status()
                 transcribed_text: str = response.json()["text"].strip()
 
-            logger.info(
-                "Transcribed voice for user %d: %r",
-                user_id,
-                transcribed_text[:100] if transcribed_text else "",
-            )
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    "Transcribed voice for user %d: %r",
+                    user_id,
+                    transcribed_text[:100] if transcribed_text else "",
+                )
 
             if not transcribed_text:
                 await update.message.reply_text(
@@ -444,6 +489,7 @@ def make_callback_handler(
     _pending_confirmations: dict[int, tuple[int, str]] = (
         pending_confirmations if pending_confirmations is not None else {}
     )
+    _allowed_ids: frozenset[int] = config.allowed_telegram_ids_set
 
     async def handle_callback(
         update: Update, context: ContextTypes.DEFAULT_TYPE
@@ -463,7 +509,7 @@ def make_callback_handler(
             return
 
         user_id = update.effective_user.id
-        if user_id not in config.allowed_telegram_ids:
+        if user_id not in _allowed_ids:
             await query.edit_message_text("Not authorized.")
             return
 
@@ -534,6 +580,11 @@ def create_application(
     Returns:
         A fully configured :class:`telegram.ext.Application` instance.
     """
+    # telegram.ext is the heaviest import in this module and is only needed
+    # here; the handler factories work off plain Update objects.
+    from telegram.ext import Application, CallbackQueryHandler, MessageHandler, filters
+    from telegram.request import HTTPXRequest
+
     _guarded_toolsets = guarded_toolsets or []
     # Shared dict — both handlers share the same reference so confirmations
     # written by the callback handler are visible to the message handler.
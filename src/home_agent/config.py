@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from functools import lru_cache
+from functools import cached_property, lru_cache
 from pathlib import Path
 
 from pydantic import Field, SecretStr
@@ -25,6 +25,9 @@ class AppConfig(BaseSettings):
         llm_max_retries: Maximum number of retries on HTTP 429 rate limit errors.
         llm_retry_base_delay: Base delay in seconds for exponential backoff on retries.
         llm_retry_max_delay: Maximum delay in seconds for exponential backoff (caps the doubling).
+        llm_retry_max_total_wait: Maximum total backoff in seconds per LLM request.
+        llm_requests_per_minute: Client-side cap on LLM requests per minute (0 disables).
+        llm_max_concurrent_requests: Cap on simultaneous LLM requests (0 disables).
         asr_url: URL of the Qwen3-ASR transcription service.
     """
 
@@ -40,6 +43,9 @@ class AppConfig(BaseSettings):
     llm_max_retries: int = 3
     llm_retry_base_delay: float = 1.0
     llm_retry_max_delay: float = 30.0
+    llm_retry_max_total_wait: float = 30.0
+    llm_requests_per_minute: float = 0.0
+    llm_max_concurrent_requests: int = 0
     admin_telegram_ids: list[int] = Field(default=[])
     asr_url: str = Field(default="http://qwen3-asr:8086")
     """URL of the Qwen3-ASR transcription service."""
@@ -47,8 +53,23 @@ class AppConfig(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
+        # Read-only after load: handlers snapshot derived values such as
+        # allowed_telegram_ids_set, so fields must not change underneath them.
+        frozen=True,
     )
 
+    @cached_property
+    def allowed_telegram_ids_set(self) -> frozenset[int]:
+        """Authorized Telegram user IDs as a frozenset for O(1) membership checks.
+
+        Computed once per config instance; the config is frozen, so the
+        whitelist cannot change after it is loaded.
+
+        Returns:
+            The entries of ``allowed_telegram_ids`` as a frozenset.
+        """
+        return frozenset(self.allowed_telegram_ids)
+
 
 @lru_cache
 def get_config() -> AppConfig:
@@ -4,6 +4,8 @@ from __future__ import annotations
 
 import json
 import logging
+from collections.abc import AsyncIterator, Sequence
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Any
 
@@ -11,6 +13,83 @@ import aiosqlite
 
 logger = logging.getLogger(__name__)
 
+# A database file path, or a long-lived connection from open_db().
+DBTarget = str | Path | aiosqlite.Connection
+
+# Applied to every long-lived connection. WAL lets readers proceed during a
+# write; synchronous=NORMAL is durable under WAL and skips an fsync per commit.
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+    # Keep hot pages in memory: 256 MiB memory-mapped I/O, ~20 MB page cache.
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-20000",
+)
+
+# Statement text is kept in constants so every call passes the identical
+# string: sqlite3 caches prepared statements per connection keyed on the SQL,
+# so a long-lived connection from open_db() parses each statement only once.
+_SQL_INSERT_MESSAGE = "INSERT INTO conversations (user_id, role, content) VALUES (?, ?, ?)"
+# Newest first; LIMIT -1 means no limit in SQLite. Rows are reversed in Python.
+_SQL_SELECT_HISTORY = (
+    "SELECT role, content FROM conversations WHERE user_id = ? ORDER BY id DESC LIMIT ?"
+)
+_SQL_UPSERT_PROFILE = (
+    "INSERT INTO user_profiles (user_id, data) VALUES (?, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data"
+)
+# json_insert on a missing '$.notes' path is a silent no-op (the UPDATE still
+# counts the row), so an absent or null notes array is created first.
+_SQL_APPEND_PROFILE_NOTE = (
+    "UPDATE user_profiles "
+    "SET data = json_set("
+    "json_insert("
+    "json_set(data, '$.notes', json(coalesce(json_extract(data, '$.notes'), '[]'))), "
+    "'$.notes[#]', ?), "
+    "'$.updated_at', ?) "
+    "WHERE user_id = ?"
+)
+_SQL_SELECT_PROFILE = "SELECT data FROM user_profiles WHERE user_id = ?"
+
+
+async def open_db(db_path: str | Path) -> aiosqlite.Connection:
+    """Open a long-lived, tuned connection to the database.
+
+    The caller owns the connection and must close it. Pass it in place of a
+    path to any helper in this module to skip the per-call connect.
+
+    Args:
+        db_path: File path to the SQLite database.
+
+    Returns:
+        An open connection with the WAL and tuning PRAGMAs applied.
+    """
+    db = await aiosqlite.connect(db_path)
+    for pragma in _CONNECTION_PRAGMAS:
+        await db.execute(pragma)
+    return db
+
+
+@asynccontextmanager
+async def _connect(db: DBTarget) -> AsyncIterator[aiosqlite.Connection]:
+    """Yield a connection for ``db``, opening a short-lived one for a path.
+
+    Connections passed in are reused as-is and left open.
+
+    Args:
+        db: Database file path or an open connection.
+
+    Yields:
+        A connection to run statements on.
+    """
+    if isinstance(db, aiosqlite.Connection):
+        yield db
+        return
+    async with aiosqlite.connect(db) as conn:
+        yield conn
+
 
 async def init_db(db_path: str | Path) -> None:
     """Initialize the SQLite database schema.
@@ -46,28 +125,50 @@ async def init_db(db_path: str | Path) -> None:
         await db.commit()
 
 
-async def save_message(db_path: str | Path, *, user_id: int, role: str, content: str) -> None:
+async def save_message(db: DBTarget, *, user_id: int, role: str, content: str) -> None:
     """Save a message to the database.
 
     Args:
-        db_path: File path to the SQLite database.
+        db: Database file path or an open connection from open_db().
         user_id: Telegram user ID.
         role: Message role (user/assistant/system).
         content: Message content.
     """
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute(
-            "INSERT INTO conversations (user_id, role, content) VALUES (?, ?, ?)",
-            (user_id, role, content),
-        )
-        await db.commit()
+    async with _connect(db) as conn:
+        await conn.execute(_SQL_INSERT_MESSAGE, (user_id, role, content))
+        await conn.commit()
 
 
-async def get_history(db_path: str | Path, *, user_id: int, limit: int | None = None) -> list[dict[str, str]]:
+async def save_messages(
+    db: DBTarget, *, user_id: int, messages: Sequence[tuple[str, str]]
+) -> None:
+    """Save several messages for one user in a single transaction.
+
+    Args:
+        db: Database file path or an open connection from open_db().
+        user_id: Telegram user ID.
+        messages: ``(role, content)`` pairs, in the order they should be stored.
+    """
+    await save_message_rows(db, [(user_id, role, content) for role, content in messages])
+
+
+async def save_message_rows(db: DBTarget, rows: Sequence[tuple[int, str, str]]) -> None:
+    """Save messages for any number of users in a single transaction.
+
+    Args:
+        db: Database file path or an open connection from open_db().
+        rows: ``(user_id, role, content)`` rows, in the order they should be stored.
+    """
+    async with _connect(db) as conn:
+        await conn.executemany(_SQL_INSERT_MESSAGE, rows)
+        await conn.commit()
+
+
+async def get_history(db: DBTarget, *, user_id: int, limit: int | None = None) -> list[dict[str, str]]:
     """Fetch recent conversation history for a user.
 
     Args:
-        db_path: File path to the SQLite database.
+        db: Database file path or an open connection from open_db().
         user_id: Telegram user ID.
         limit: Optional max number of messages to return.
 
@@ -77,53 +178,66 @@ async def get_history(db_path: str | Path, *, user_id: int, limit: int | None =
     Raises:
         RuntimeError: If database query fails.
     """
-    if limit is not None:
-        query = """
-            SELECT role, content FROM (
-                SELECT role, content, id FROM conversations
-                WHERE user_id = ?
-                ORDER BY id DESC
-                LIMIT ?
-            ) ORDER BY id ASC
-            """
-        params = (user_id, limit)
-    else:
-        query = "SELECT role, content FROM conversations WHERE user_id = ? ORDER BY id ASC"
-        params = (user_id,)
     try:
-        async with aiosqlite.connect(db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute(query, params)
+        async with _connect(db) as conn:
+            cursor = await conn.execute(
+                _SQL_SELECT_HISTORY, (user_id, -1 if limit is None else limit)
+            )
             rows = await cursor.fetchall()
             await cursor.close()
-        return [{"role": row["role"], "content": row["content"]} for row in rows]
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
     except aiosqlite.OperationalError as e:
         logger.error("Database query failed for user %d: %s", user_id, e, exc_info=True)
         raise RuntimeError(f"Failed to retrieve conversation history for user {user_id}") from e
 
 
-async def save_profile(db_path: str | Path, *, user_id: int, data: dict[str, Any]) -> None:
+async def save_profile(
+    db: DBTarget, *, user_id: int, data: dict[str, Any] | bytes
+) -> None:
     """Persist a user profile payload.
 
     Args:
-        db_path: File path to the SQLite database.
+        db: Database file path or an open connection from open_db().
         user_id: Telegram user ID.
-        data: Profile data to store.
+        data: Profile data to store, as a dict or as already-encoded UTF-8
+            JSON bytes (stored as text without re-encoding).
     """
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute(
-            "INSERT INTO user_profiles (user_id, data) VALUES (?, ?) "
-            "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data",
-            (user_id, json.dumps(data)),
-        )
-        await db.commit()
+    payload = data.decode() if isinstance(data, bytes) else json.dumps(data)
+    async with _connect(db) as conn:
+        await conn.execute(_SQL_UPSERT_PROFILE, (user_id, payload))
+        await conn.commit()
+
 
+async def append_profile_note(
+    db: DBTarget, *, user_id: int, note: str, updated_at: str
+) -> bool:
+    """Append a note to a stored profile without rewriting the whole payload.
 
-async def get_profile(db_path: str | Path, *, user_id: int) -> dict[str, Any] | None:
+    Uses SQLite's JSON1 functions to push the note onto the ``notes`` array
+    (creating it if the payload lacks one) and bump ``updated_at`` in place,
+    so the profile never round-trips through Python.
+
+    Args:
+        db: Database file path or an open connection from open_db().
+        user_id: Telegram user ID.
+        note: Note text to append.
+        updated_at: ISO-8601 timestamp to store as the profile's ``updated_at``,
+            formatted as the profile serializer writes it.
+
+    Returns:
+        True if a stored profile was updated, False if none exists for the user.
+    """
+    async with _connect(db) as conn:
+        cursor = await conn.execute(_SQL_APPEND_PROFILE_NOTE, (note, updated_at, user_id))
+        await conn.commit()
+        return cursor.rowcount > 0
+
+
+async def get_profile(db: DBTarget, *, user_id: int) -> dict[str, Any] | None:
     """Retrieve a stored user profile payload.
 
     Args:
-        db_path: File path to the SQLite database.
+        db: Database file path or an open connection from open_db().
         user_id: Telegram user ID.
 
     Returns:
@@ -133,8 +247,8 @@ async def get_profile(db_path: str | Path, *, user_id: int) -> dict[str, Any] |
         RuntimeError: If database query fails.
     """
     try:
-        async with aiosqlite.connect(db_path) as db:
-            cursor = await db.execute("SELECT data FROM user_profiles WHERE user_id = ?", (user_id,))
+        async with _connect(db) as conn:
+            cursor = await conn.execute(_SQL_SELECT_PROFILE, (user_id,))
             row = await cursor.fetchone()
             await cursor.close()
         if row is None:
@@ -6,16 +6,152 @@ sliding_window_processor for use with PydanticAI's history_processors.
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import logging
 from collections.abc import Callable
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, TextPart, UserPromptPart
 
-from home_agent.db import get_history, save_message
+from home_agent.db import DBTarget, get_history, open_db, save_message, save_message_rows, save_messages
+
+if TYPE_CHECKING:
+    import aiosqlite
 
 logger = logging.getLogger(__name__)
 
+# Request/response pairs of past conversation the agent sees. The bot loads
+# only 2 * HISTORY_WINDOW_PAIRS rows, and the agent's sliding window trims to
+# the same size, so older rows are never read from disk.
+HISTORY_WINDOW_PAIRS = 20
+
+
+class HistoryWriter:
+    """Background writer that batches conversation rows into few transactions.
+
+    Callers enqueue rows and return immediately; :meth:`run` drains the queue
+    and writes each batch with one ``executemany`` and one commit, so the
+    SQLite commit stays off the reply path and concurrent users share commits.
+
+    Attributes:
+        max_batch: Maximum number of rows written per transaction.
+        max_delay: Seconds to wait for more rows after the first one arrives.
+    """
+
+    def __init__(
+        self, db: DBTarget, *, max_batch: int = 100, max_delay: float = 0.05
+    ) -> None:
+        """Initialize the writer.
+
+        Args:
+            db: Database file path or an open connection to write through.
+            max_batch: Maximum number of rows written per transaction.
+            max_delay: Seconds to wait for more rows after the first one arrives.
+        """
+        self._db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue[tuple[int, str, str]] = asyncio.Queue()
+        # Unwritten row count per user, and an event set once it drops to zero.
+        self._pending: dict[int, int] = {}
+        self._written: dict[int, asyncio.Event] = {}
+
+    @property
+    def pending(self) -> bool:
+        """True while enqueued rows have not been written yet."""
+        return bool(self._pending)
+
+    def has_pending(self, user_id: int) -> bool:
+        """Report whether rows enqueued for one user have not been written yet.
+
+        Args:
+            user_id: Telegram user ID.
+
+        Returns:
+            True if at least one of the user's rows is still queued.
+        """
+        return user_id in self._pending
+
+    def enqueue(self, user_id: int, role: str, content: str) -> None:
+        """Queue one message row for writing.
+
+        Args:
+            user_id: Telegram user ID.
+            role: Message role ('user', 'assistant', or 'system').
+            content: Message text content.
+        """
+        self._queue.put_nowait((user_id, role, content))
+        self._pending[user_id] = self._pending.get(user_id, 0) + 1
+        if user_id not in self._written:
+            self._written[user_id] = asyncio.Event()
+
+    async def flush(self) -> None:
+        """Wait until every row enqueued so far has been written (or dropped)."""
+        await self._queue.join()
+
+    async def wait_for_user(self, user_id: int) -> None:
+        """Wait until the rows enqueued so far for one user have been written (or dropped).
+
+        Rows queued for other users are not waited for.
+
+        Args:
+            user_id: Telegram user ID.
+        """
+        written = self._written.get(user_id)
+        if written is not None:
+            await written.wait()
+
+    async def write_queued(self) -> None:
+        """Write every queued row now, in one transaction, without :meth:`run`.
+
+        Used when the :meth:`run` task is no longer running, so waiting on it
+        would never return.
+        """
+        batch: list[tuple[int, str, str]] = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._write(batch)
+
+    async def run(self) -> None:
+        """Write queued rows in batches until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+
+    async def _write(self, batch: list[tuple[int, str, str]]) -> None:
+        """Write one batch of rows and mark them done, even if the write fails.
+
+        Args:
+            batch: (user_id, role, content) rows taken off the queue.
+        """
+        try:
+            await save_message_rows(self._db, batch)
+            logger.debug("Wrote %d queued history rows", len(batch))
+        except Exception:
+            logger.exception("Failed to write %d queued history rows", len(batch))
+        finally:
+            for user_id, _, _ in batch:
+                self._queue.task_done()
+                left = self._pending[user_id] - 1
+                if left:
+                    self._pending[user_id] = left
+                else:
+                    del self._pending[user_id]
+                    self._written.pop(user_id).set()
+
 
 class HistoryManager:
     """Manages conversation history with database persistence.
@@ -23,17 +159,96 @@ class HistoryManager:
     Wraps db.py for message CRUD operations, providing a higher-level
     interface for saving and retrieving conversation history.
 
+    Use as an async context manager (or call :meth:`connect`) to hold one
+    connection for the manager's lifetime. With ``write_behind=True`` the
+    connected manager also runs a :class:`HistoryWriter`, so saves return
+    without waiting for the commit; a read first waits for the reader's own
+    queued rows only.
+
     Attributes:
         db_path: Path to the SQLite database file.
+        write_behind: Whether a connected manager queues writes in the background.
     """
 
-    def __init__(self, db_path: str | Path) -> None:
+    def __init__(self, db_path: str | Path, *, write_behind: bool = False) -> None:
         """Initialize HistoryManager with the database path.
 
         Args:
             db_path: Path to the SQLite database file.
+            write_behind: Queue writes on a background HistoryWriter while connected.
         """
         self.db_path = Path(db_path)
+        self.write_behind = write_behind
+        self._db: aiosqlite.Connection | None = None
+        self._writer: HistoryWriter | None = None
+        self._writer_task: asyncio.Task[None] | None = None
+
+    async def connect(self) -> None:
+        """Open a long-lived connection reused by every query until :meth:`close`.
+
+        Without it, each query opens and closes its own connection. Also starts
+        the background writer when ``write_behind`` is enabled.
+        """
+        if self._db is None:
+            self._db = await open_db(self.db_path)
+        if self.write_behind and self._writer is None:
+            self._writer = HistoryWriter(self._db)
+            self._writer_task = asyncio.create_task(self._writer.run())
+
+    async def close(self) -> None:
+        """Flush queued writes, then close the connection opened by :meth:`connect`."""
+        if self._writer is not None and self._writer_task is not None:
+            await self._sync_writes()
+            self._writer_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._writer_task
+            self._writer = None
+            self._writer_task = None
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def __aenter__(self) -> HistoryManager:
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    @property
+    def _target(self) -> DBTarget:
+        """The open connection if there is one, otherwise the database path."""
+        return self._db if self._db is not None else self.db_path
+
+    @property
+    def _queueing(self) -> bool:
+        """True while saves can be handed to a running background writer."""
+        return self._writer_task is not None and not self._writer_task.done()
+
+    async def _sync_writes(self, user_id: int | None = None) -> None:
+        """Make queued rows durable: every user's, or only ``user_id``'s.
+
+        Waits on the background writer while its task runs. If the task has
+        stopped, the leftover queue is written here instead of waiting forever.
+
+        Args:
+            user_id: Only wait for this user's rows. None waits for all rows.
+        """
+        writer, task = self._writer, self._writer_task
+        if writer is None or task is None:
+            return
+        if not (writer.pending if user_id is None else writer.has_pending(user_id)):
+            return
+        if not task.done():
+            waiter = asyncio.ensure_future(
+                writer.flush() if user_id is None else writer.wait_for_user(user_id)
+            )
+            await asyncio.wait({waiter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if waiter.done():
+                return
+            waiter.cancel()
+        logger.error("History writer stopped; writing queued rows directly")
+        await writer.write_queued()
 
     async def save_message(self, *, user_id: int, role: str, content: str) -> None:
         """Save a message to conversation history.
@@ -43,9 +258,34 @@ class HistoryManager:
             role: Message role ('user', 'assistant', or 'system').
             content: Message text content.
         """
-        await save_message(self.db_path, user_id=user_id, role=role, content=content)
+        if self._writer is not None and self._queueing:
+            self._writer.enqueue(user_id, role, content)
+            return
+        # Rows left behind by a stopped writer go first, to keep their order.
+        await self._sync_writes()
+        await save_message(self._target, user_id=user_id, role=role, content=content)
         logger.debug("Saved message for user %s (role=%s)", user_id, role)
 
+    async def save_turn(self, *, user_id: int, user_text: str, assistant_text: str) -> None:
+        """Save a user message and the assistant's reply in one transaction.
+
+        Args:
+            user_id: Telegram user ID.
+            user_text: The user's message text.
+            assistant_text: The assistant's reply text.
+        """
+        if self._writer is not None and self._queueing:
+            self._writer.enqueue(user_id, "user", user_text)
+            self._writer.enqueue(user_id, "assistant", assistant_text)
+            return
+        await self._sync_writes()
+        await save_messages(
+            self._target,
+            user_id=user_id,
+            messages=(("user", user_text), ("assistant", assistant_text)),
+        )
+        logger.debug("Saved conversation turn for user %s", user_id)
+
     async def get_history(
         self, *, user_id: int, limit: int | None = None
     ) -> list[dict[str, str]]:
@@ -58,7 +298,10 @@ class HistoryManager:
         Returns:
             List of messages, oldest first, each with 'role' and 'content' keys.
         """
-        return await get_history(self.db_path, user_id=user_id, limit=limit)
+        # Read-your-writes: make sure this user's queued turns are on disk
+        # first, without waiting behind other users' rows.
+        await self._sync_writes(user_id)
+        return await get_history(self._target, user_id=user_id, limit=limit)
 
 
 def convert_history_to_messages(
@@ -142,39 +385,45 @@ def sliding_window_processor(
             Reduced list containing the last N complete pairs, followed by any
             trailing messages that do not form a complete pair.
         """
-        # Walk forward collecting complete (ModelRequest, ModelResponse) pairs and
-        # tracking any trailing messages that don't form a complete pair.
-        pairs: list[tuple[ModelRequest, ModelResponse]] = []
-        tail: list[ModelMessage] = []
-        i = 0
-        while i < len(messages):
-            msg = messages[i]
-            if isinstance(msg, ModelRequest):
-                next_msg = messages[i + 1] if i + 1 < len(messages) else None
-                if isinstance(next_msg, ModelResponse):
-                    pairs.append((msg, next_msg))
-                    i += 2
-                    tail = []  # consumed — reset tail
-                else:
-                    # Unpaired request — part of the trailing sequence
-                    tail = list(messages[i:])
-                    break
+        # Walk backwards from the end so the cost is bounded by the window, not
+        # the full history. Everything after the last complete
+        # (ModelRequest, ModelResponse) pair is the in-progress tail; from there,
+        # step back one pair at a time until n pairs are kept, stepping over
+        # any message that is not part of a complete pair. Regular histories
+        # come back as a single tail slice.
+        last_response = len(messages) - 1
+        while last_response >= 1 and not (
+            isinstance(messages[last_response], ModelResponse)
+            and isinstance(messages[last_response - 1], ModelRequest)
+        ):
+            last_response -= 1
+        if last_response < 1:
+            # No complete pair at all — nothing to trim.
+            return list(messages)
+
+        starts: list[int] = []
+        i = last_response
+        while i >= 1 and len(starts) < n:
+            if isinstance(messages[i], ModelResponse) and isinstance(
+                messages[i - 1], ModelRequest
+            ):
+                starts.append(i - 1)
+                i -= 2
             else:
-                # Response without a preceding request in this window — skip
-                i += 1
+                # Stray response or orphan request: drop it and keep counting.
+                i -= 1
 
-        # Keep only the last n pairs
-        kept_pairs = pairs[-n:] if n < len(pairs) else pairs
+        tail = messages[last_response + 1:]
+        if not starts:
+            return tail
+        if starts[0] - starts[-1] == 2 * (len(starts) - 1):
+            # Kept pairs are adjacent: nothing was skipped between them.
+            return messages[starts[-1]:]
 
-        # Flatten pairs back to a list of ModelMessage
         result: list[ModelMessage] = []
-        for req, resp in kept_pairs:
-            result.append(req)
-            result.append(resp)
-
-        # Re-append any trailing messages (current step's in-progress sequence)
+        for start in reversed(starts):
+            result.extend(messages[start:start + 2])
         result.extend(tail)
-
         return result
 
     return processor
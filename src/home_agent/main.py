@@ -7,7 +7,15 @@ This is the composition root — the only place where all components are assembl
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import logging
+import signal
+
+try:
+    import uvloop
+except ImportError:  # optional extra; not available on Windows
+    uvloop = None
+
 from home_agent.agent import RetryConfig, create_agent
 from home_agent.bot import create_application
 from home_agent.config import get_config
@@ -36,6 +44,25 @@ def setup_logging(log_level: str) -> None:
     logging.getLogger().setLevel(numeric_level)
 
 
+async def _wait_for_stop_signal() -> None:
+    """Block until the process receives SIGINT or SIGTERM.
+
+    On platforms without loop signal handlers (Windows) this waits forever and
+    shutdown falls back to the KeyboardInterrupt handling in :func:`main`.
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop_event.set)
+    try:
+        await stop_event.wait()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError):
+                loop.remove_signal_handler(sig)
+
+
 async def _async_main() -> None:
     """Async entry point: initializes all components and runs the bot.
 
@@ -45,9 +72,10 @@ async def _async_main() -> None:
     3. Initialize SQLite database (creates tables if needed)
     4. Create ProfileManager and HistoryManager
     5. Create MCPRegistry and register Seerr (Overseerr) server
-    6. Create agent and enter its context (opens MCP connections once)
-    7. Start Telegram bot polling (blocks until interrupted)
-    8. On exit: agent context closes MCP connections cleanly
+    6. Create agent, then open the managers' DB connections and the agent's
+       MCP connections once
+    7. Start Telegram bot polling (blocks until SIGINT or SIGTERM)
+    8. On exit: stop polling, then close MCP and DB connections cleanly
     """
     config = get_config()
     setup_logging(config.log_level)
@@ -61,8 +89,12 @@ async def _async_main() -> None:
     await init_db(config.db_path)
 
     # Create managers
-    profile_manager = ProfileManager(db_path=config.db_path)
-    history_manager = HistoryManager(db_path=config.db_path)
+    # Back-to-back tool saves within 50ms (e.g. movie + series quality in one
+    # turn) are coalesced into one write; closing the manager flushes them.
+    profile_manager = ProfileManager(db_path=config.db_path, save_delay=0.05)
+    # Conversation turns are committed by a background writer so the SQLite
+    # commit stays off the reply path; closing the manager flushes them.
+    history_manager = HistoryManager(db_path=config.db_path, write_behind=True)
 
     # Register MCP servers
     registry = MCPRegistry()
@@ -80,11 +112,15 @@ async def _async_main() -> None:
             max_retries=config.llm_max_retries,
             base_delay=config.llm_retry_base_delay,
             max_delay=config.llm_retry_max_delay,
+            max_total_wait=config.llm_retry_max_total_wait,
+            requests_per_minute=config.llm_requests_per_minute,
+            max_concurrent_requests=config.llm_max_concurrent_requests,
         ),
     )
 
-    # Open MCP connections once for the lifetime of the bot
-    async with agent:
+    # Open the managers' database connections and the MCP connections once
+    # for the lifetime of the bot
+    async with profile_manager, history_manager, agent:
         logger.info("MCP connections established, starting Telegram bot...")
         app = create_application(
             config, profile_manager, history_manager, agent, guarded_toolsets=toolsets
@@ -94,18 +130,27 @@ async def _async_main() -> None:
             assert app.updater is not None
             await app.updater.start_polling()
             logger.info("Bot is polling. Press Ctrl-C to stop.")
-            # Block until stopped
-            await asyncio.Event().wait()
+            # Block until SIGINT/SIGTERM (Ctrl-C, docker stop), then unwind in
+            # order: stop polling, stop the app, then leave the async with
+            # blocks so MCP closes and queued history writes are flushed.
+            await _wait_for_stop_signal()
+            logger.info("Shutting down home-agent...")
+            await app.updater.stop()
+            await app.stop()
 
 
 def main() -> None:
     """Synchronous entry point — runs the async main loop.
 
+    Uses uvloop's event loop when the ``uvloop`` extra is installed and falls
+    back to the default asyncio loop otherwise.
+
     Raises:
         KeyboardInterrupt: Caught and handled for graceful shutdown.
     """
+    run = uvloop.run if uvloop is not None else asyncio.run
     try:
-        asyncio.run(_async_main())
+        run(_async_main())
     except KeyboardInterrupt:
         logger.info("Shutting down home-agent...")
 
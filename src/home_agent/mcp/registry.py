@@ -19,6 +19,9 @@ class MCPRegistry:
     Manages server configurations and creates GuardedToolset-wrapped
     FastMCPToolset instances for the PydanticAI agent.
 
+    Toolsets are built once per server and reused on later calls, so
+    rebuilding an agent does not open a second MCP connection.
+
     Attributes:
         servers: Dict mapping server names to ServerConfig instances.
     """
@@ -26,6 +29,7 @@ class MCPRegistry:
     def __init__(self) -> None:
         """Initialize the MCP registry."""
         self.servers: dict[str, ServerConfig] = {}
+        self._toolsets: dict[str, GuardedToolset] = {}
 
     def register(self, config: ServerConfig) -> None:
         """Register an MCP server configuration.
@@ -34,26 +38,32 @@ class MCPRegistry:
             config: Server configuration to register.
         """
         self.servers[config.name] = config
+        # Re-registering a name may change its URL; drop the stale toolset.
+        self._toolsets.pop(config.name, None)
 
     def get_toolsets(self) -> list[GuardedToolset]:
-        """Create GuardedToolset-wrapped instances for all enabled servers.
+        """Return GuardedToolset-wrapped instances for all enabled servers.
 
         Each FastMCPToolset is wrapped in a GuardedToolset that enforces
-        quality and confirmation gates before forwarding tool calls.
+        quality and confirmation gates before forwarding tool calls. The
+        wrapped toolset is created on first request and cached per server.
 
         Returns:
             List of GuardedToolset instances for enabled servers.
         """
         toolsets = []
         for server in self.servers.values():
-            if server.enabled:
-                inner_toolset = FastMCPToolset(server.url)
-                guarded = GuardedToolset(inner_toolset)
-                toolsets.append(guarded)
+            if not server.enabled:
+                continue
+            guarded = self._toolsets.get(server.name)
+            if guarded is None:
+                guarded = GuardedToolset(FastMCPToolset(server.url))
+                self._toolsets[server.name] = guarded
                 logger.debug(
                     "Wrapped MCP toolset in GuardedToolset",
                     extra={"server": server.name},
                 )
+            toolsets.append(guarded)
         return toolsets
 
     def get_tool_names(self) -> list[str]:
@@ -0,0 +1,124 @@
+"""Client-side token-bucket rate limiter for model requests."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class TokenBucket:
+    """Async token bucket that paces requests to a provider's known rate.
+
+    Holds up to ``capacity`` tokens and refills at ``refill_rate`` tokens per
+    second. :meth:`acquire` waits locally until enough tokens are available, so
+    a request that would be rejected with HTTP 429 is delayed instead of sent.
+    Waiters are served in arrival order.
+
+    The rate adapts AIMD-style: :meth:`on_throttled` (an observed 429) cuts it
+    by ``decrease_factor`` down to ``min_rate``, and each :meth:`on_success`
+    adds ``increase_step`` back up to ``max_rate``, so the bucket converges on
+    the provider's actual limit when the configured one is too optimistic.
+
+    Attributes:
+        capacity: Maximum number of tokens (the allowed burst size).
+        refill_rate: Tokens added per second. Changes as the bucket adapts.
+        min_rate: Lower bound for refill_rate. Defaults to a tenth of the
+            initial rate.
+        max_rate: Upper bound for refill_rate. Defaults to the initial rate.
+        decrease_factor: Multiplier applied to refill_rate on each 429.
+        increase_step: Tokens/second added to refill_rate per success.
+            Defaults to a twentieth of max_rate.
+        tokens: Tokens currently available. Starts full.
+        last_refill: ``time.monotonic()`` timestamp of the last refill. Set in
+            the future by a ``Retry-After`` hint to hold the bucket empty.
+    """
+
+    capacity: float
+    refill_rate: float
+    min_rate: float | None = None
+    max_rate: float | None = None
+    decrease_factor: float = 0.5
+    increase_step: float | None = None
+    tokens: float = field(init=False)
+    last_refill: float = field(init=False)
+    _lock: asyncio.Lock = field(init=False, repr=False, default_factory=asyncio.Lock)
+
+    def __post_init__(self) -> None:
+        """Validate the rate and start with a full bucket.
+
+        Raises:
+            ValueError: If capacity or refill_rate is not positive.
+        """
+        if self.capacity <= 0 or self.refill_rate <= 0:
+            raise ValueError("capacity and refill_rate must be positive")
+        if self.max_rate is None:
+            self.max_rate = self.refill_rate
+        if self.min_rate is None:
+            self.min_rate = min(self.refill_rate, self.max_rate) / 10
+        if self.increase_step is None:
+            self.increase_step = self.max_rate / 20
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+
+    @classmethod
+    def per_minute(cls, requests: float) -> TokenBucket:
+        """Build a bucket allowing ``requests`` per minute with a burst of the same size.
+
+        The burst is at least one request so fractional rates still admit a
+        single-token acquire.
+
+        Args:
+            requests: Requests allowed per minute.
+
+        Returns:
+            A new :class:`TokenBucket`.
+        """
+        return cls(capacity=max(1.0, requests), refill_rate=requests / 60.0)
+
+    def _refill(self) -> None:
+        """Add the tokens accrued since the last refill, up to capacity."""
+        now = time.monotonic()
+        if now > self.last_refill:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate
+            )
+            self.last_refill = now
+
+    def on_throttled(self, retry_after: float | None = None) -> None:
+        """Back off after the provider rejected a request with HTTP 429.
+
+        Args:
+            retry_after: Seconds the server asked to wait, if it said. The
+                bucket is then held empty until that point.
+        """
+        assert self.min_rate is not None
+        self.refill_rate = max(self.min_rate, self.refill_rate * self.decrease_factor)
+        if retry_after is not None:
+            self.tokens = 0.0
+            self.last_refill = max(self.last_refill, time.monotonic() + retry_after)
+
+    def on_success(self) -> None:
+        """Recover some rate after a request went through."""
+        assert self.max_rate is not None and self.increase_step is not None
+        self.refill_rate = min(self.max_rate, self.refill_rate + self.increase_step)
+
+    async def acquire(self, cost: float = 1.0) -> None:
+        """Wait until ``cost`` tokens are available, then consume them.
+
+        Args:
+            cost: Number of tokens to consume. Defaults to 1.
+
+        Raises:
+            ValueError: If cost exceeds capacity (it could never be satisfied).
+        """
+        if cost > self.capacity:
+            raise ValueError(f"cost {cost} exceeds bucket capacity {self.capacity}")
+        async with self._lock:
+            self._refill()
+            while self.tokens < cost:
+                held = max(0.0, self.last_refill - time.monotonic())
+                await asyncio.sleep(held + (cost - self.tokens) / self.refill_rate)
+                self._refill()
+            self.tokens -= cost
@@ -3,18 +3,101 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import logging
-from collections.abc import AsyncIterator, Callable, Coroutine
-from contextlib import asynccontextmanager
-from typing import Any
+import math
+import random
+import time
+from collections.abc import AsyncIterator, Callable, Coroutine, Mapping
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Any, Literal
 
 from pydantic_ai.exceptions import ModelHTTPError
 from pydantic_ai.messages import ModelMessage, ModelResponse
-from pydantic_ai.models import Model, ModelRequestParameters, ModelSettings, StreamedResponse
+from pydantic_ai.models import (
+    Model,
+    ModelRequestParameters,
+    ModelSettings,
+    StreamedResponse,
+    infer_model,
+)
+
+from home_agent.models.rate_limit import TokenBucket
+
+if TYPE_CHECKING:
+    from pydantic_ai import RunContext
 
 logger = logging.getLogger(__name__)
 
 OnRetryCallback = Callable[[int, float], Coroutine[Any, Any, None]]
+JitterMode = Literal["none", "full", "equal"]
+
+# X-RateLimit-Reset values above this are epoch milliseconds (OpenRouter),
+# below it epoch seconds.
+_EPOCH_MS_THRESHOLD = 1e11
+
+
+def _response_headers(exc: ModelHTTPError) -> Mapping[str, str] | None:
+    """Return the HTTP response headers behind a ModelHTTPError, if any.
+
+    PydanticAI does not copy headers onto the error; provider models raise it
+    ``from`` the SDK exception, whose ``response`` carries them.
+
+    Args:
+        exc: The error raised by the inner model.
+
+    Returns:
+        The response headers, or None when they are not reachable.
+    """
+    headers = getattr(exc, "headers", None)
+    if headers is not None:
+        return headers
+    response = getattr(exc.__cause__, "response", None)
+    return getattr(response, "headers", None)
+
+
+def _retry_after_seconds(exc: ModelHTTPError) -> float | None:
+    """Extract the server's requested wait from ``Retry-After`` or ``X-RateLimit-Reset``.
+
+    ``Retry-After`` may be delta-seconds or an HTTP date; ``X-RateLimit-Reset``
+    is an epoch timestamp in seconds or milliseconds.
+
+    Args:
+        exc: The 429 error raised by the inner model.
+
+    Returns:
+        Seconds to wait (never negative), or None if no usable hint is present.
+    """
+    headers = _response_headers(exc)
+    if not headers:
+        return None
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            seconds = float(retry_after)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                seconds = math.nan
+        # float() accepts "inf" and "nan"; neither is a usable wait.
+        if math.isfinite(seconds):
+            return max(0.0, seconds)
+
+    reset = headers.get("x-ratelimit-reset")
+    if reset:
+        try:
+            reset_at = float(reset)
+        except ValueError:
+            return None
+        if not math.isfinite(reset_at):
+            return None
+        if reset_at > _EPOCH_MS_THRESHOLD:
+            reset_at /= 1000
+        return max(0.0, reset_at - time.time())
+
+    return None
 
 
 class RetryingModel(Model):
@@ -23,9 +106,22 @@ class RetryingModel(Model):
     Wraps any :class:`pydantic_ai.models.Model` and intercepts
     :class:`pydantic_ai.exceptions.ModelHTTPError` with ``status_code == 429``,
     sleeping with exponential backoff before re-trying up to ``max_retries`` times.
+    When the response carries a ``Retry-After`` or ``X-RateLimit-Reset`` header,
+    the wait is stretched to honour it (still capped at ``max_delay``).
+
+    Backoff delays are randomised ("full" jitter by default) so concurrent users
+    rate-limited at the same moment do not all retry at the same instant.
 
-    Streaming requests are delegated directly without retry because streaming
-    responses are stateful and cannot be safely replayed.
+    An optional :class:`~home_agent.models.rate_limit.TokenBucket` paces every
+    attempt (streaming included) before it reaches the provider, so requests
+    over the known rate wait locally instead of costing a rejected round-trip.
+    ``max_concurrency`` additionally caps how many requests are in flight at
+    once, so a burst of users queues locally instead of hitting the provider
+    together.
+
+    Streaming requests are retried only while the stream is being opened: a
+    429 raised before the stream is handed to the caller is safe to replay,
+    but once chunks may have been consumed errors propagate unchanged.
 
     The inner model is resolved lazily from a model name string so that API key
     validation is deferred until the first actual request (honouring
@@ -37,6 +133,10 @@ class RetryingModel(Model):
         max_retries: Maximum number of retry attempts after the initial failure.
         base_delay: Base delay in seconds for the first retry. Doubles each attempt.
         max_delay: Maximum delay in seconds for exponential backoff (caps the doubling).
+        max_total_wait: Maximum total seconds of backoff sleep per request.
+        jitter: How the backoff delay is randomised before sleeping.
+        rate_limiter: Optional token bucket acquired before each inner request.
+        max_concurrency: Maximum simultaneous inner requests, or None for no cap.
         on_retry: Optional async callback invoked before each retry with
             ``(attempt, wait_seconds)``.
     """
@@ -48,6 +148,10 @@ class RetryingModel(Model):
         max_retries: int = 3,
         base_delay: float = 1.0,
         max_delay: float = 30.0,
+        max_total_wait: float = 30.0,
+        jitter: JitterMode = "full",
+        rate_limiter: TokenBucket | None = None,
+        max_concurrency: int | None = None,
         on_retry: OnRetryCallback | None = None,
     ) -> None:
         """Initialise the retrying model wrapper.
@@ -63,6 +167,20 @@ class RetryingModel(Model):
                 Defaults to 1.0.
             max_delay: Maximum delay in seconds for exponential backoff. Caps the
                 doubling so delays never exceed this value. Defaults to 30.0.
+            max_total_wait: Budget in seconds for all backoff sleeps of one
+                request. A retry whose sleep would exceed it is abandoned and
+                the 429 re-raised, even if attempts remain. Defaults to 30.0.
+            jitter: ``"full"`` sleeps a uniform random time in ``[0, delay]``,
+                ``"equal"`` in ``[delay / 2, delay]``, and ``"none"`` sleeps exactly
+                ``delay`` (deterministic; useful in tests). Defaults to ``"full"``.
+            rate_limiter: Optional client-side token bucket. When set, one token
+                is acquired before every request to the inner model, including
+                retries and streaming requests, and the bucket is told about
+                every 429 and every successful request so its rate adapts.
+                Defaults to None (no pacing).
+            max_concurrency: Maximum number of inner requests in flight at once
+                across all callers. Backoff sleeps do not hold a slot; a stream
+                holds one until it is closed. Defaults to None (no cap).
             on_retry: Optional async callback called before each sleep with
                 ``(attempt: int, wait_seconds: float)``.  Useful for logging or
                 telemetry in tests.
@@ -72,8 +190,32 @@ class RetryingModel(Model):
         self.max_retries = max_retries
         self.base_delay = base_delay
         self.max_delay = max_delay
+        self.max_total_wait = max_total_wait
+        self.jitter = jitter
+        self.rate_limiter = rate_limiter
+        self.max_concurrency = max_concurrency
+        self._in_flight: asyncio.Semaphore | contextlib.nullcontext[None] = (
+            asyncio.Semaphore(max_concurrency)
+            if max_concurrency is not None
+            else contextlib.nullcontext()
+        )
         self.on_retry = on_retry
 
+    def _jittered(self, delay: float) -> float:
+        """Apply the configured jitter mode to a backoff delay.
+
+        Args:
+            delay: The exponential backoff delay for this attempt.
+
+        Returns:
+            The number of seconds to sleep.
+        """
+        if self.jitter == "full":
+            return random.uniform(0.0, delay)
+        if self.jitter == "equal":
+            return delay / 2 + random.uniform(0.0, delay / 2)
+        return delay
+
     @property
     def inner(self) -> Model:
         """Resolve and return the inner model, instantiating it if necessary.
@@ -82,8 +224,6 @@ class RetryingModel(Model):
             The resolved :class:`~pydantic_ai.models.Model` instance.
         """
         if self._inner_model is None:
-            from pydantic_ai.models import infer_model
-
             self._inner_model = infer_model(self._model_name_or_instance)
         return self._inner_model
 
@@ -105,6 +245,54 @@ class RetryingModel(Model):
         """
         return self.inner.system
 
+    async def _back_off(
+        self, exc: ModelHTTPError, attempt: int, delay: float, waited: float
+    ) -> float | None:
+        """Decide whether a failed attempt is retried, and sleep before it if so.
+
+        Args:
+            exc: The error raised by the inner model.
+            attempt: Zero-based index of the attempt that failed.
+            delay: The current exponential backoff delay.
+            waited: Seconds already spent in backoff sleeps for this request.
+
+        Returns:
+            The number of seconds slept, or None if ``exc`` must be re-raised
+            (not a 429, retries are exhausted, or the next sleep would exceed
+            ``max_total_wait``).
+        """
+        if exc.status_code != 429:
+            return None
+        server_delay = _retry_after_seconds(exc)
+        if self.rate_limiter is not None:
+            # The bucket is shared by every user; a daily-quota reset hours away
+            # must not stall all later requests past what one retry would wait.
+            self.rate_limiter.on_throttled(
+                None if server_delay is None else min(server_delay, self.max_delay)
+            )
+        if attempt >= self.max_retries:
+            return None
+        wait = self._jittered(delay)
+        if server_delay is not None:
+            wait = min(max(server_delay, wait), self.max_delay)
+        if waited + wait > self.max_total_wait:
+            logger.warning(
+                "HTTP 429 rate limit; giving up after %.1fs of backoff (limit %.1fs)",
+                waited,
+                self.max_total_wait,
+            )
+            return None
+        logger.warning(
+            "HTTP 429 rate limit on attempt %d/%d; retrying in %.1fs",
+            attempt + 1,
+            self.max_retries + 1,
+            wait,
+        )
+        if self.on_retry is not None:
+            await self.on_retry(attempt, wait)
+        await asyncio.sleep(wait)
+        return wait
+
     async def request(
         self,
         messages: list[ModelMessage],
@@ -115,7 +303,8 @@ class RetryingModel(Model):
 
         Retries up to ``max_retries`` times with exponential backoff when the
         inner model raises :class:`~pydantic_ai.exceptions.ModelHTTPError` with
-        ``status_code == 429``.  All other exceptions propagate immediately.
+        ``status_code == 429``.  A server-supplied wait hint extends the backoff
+        delay for that attempt.  All other exceptions propagate immediately.
 
         Args:
             messages: The conversation messages to send.
@@ -130,50 +319,92 @@ class RetryingModel(Model):
                 for non-429 HTTP errors.
             Exception: Any non-HTTP exception is propagated immediately.
         """
+        inner = self.inner
         delay = self.base_delay
+        waited = 0.0
         for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
             try:
-                return await self.inner.request(
-                    messages, model_settings, model_request_parameters
-                )
+                async with self._in_flight:
+                    response = await inner.request(
+                        messages, model_settings, model_request_parameters
+                    )
             except ModelHTTPError as exc:
-                if exc.status_code != 429 or attempt >= self.max_retries:
+                slept = await self._back_off(exc, attempt, delay, waited)
+                if slept is None:
                     raise
-                logger.warning(
-                    "HTTP 429 rate limit on attempt %d/%d; retrying in %.1fs",
-                    attempt + 1,
-                    self.max_retries + 1,
-                    delay,
-                )
-                if self.on_retry is not None:
-                    await self.on_retry(attempt, delay)
-                await asyncio.sleep(delay)
+                waited += slept
                 delay = min(delay * 2, self.max_delay)
+            else:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.on_success()
+                return response
 
         # Unreachable — the loop always returns or raises, but satisfies type checkers.
         raise RuntimeError("Retry loop exited unexpectedly")  # pragma: no cover
 
-    @asynccontextmanager
+    @contextlib.asynccontextmanager
     async def request_stream(
         self,
         messages: list[ModelMessage],
         model_settings: ModelSettings | None,
         model_request_parameters: ModelRequestParameters,
+        run_context: RunContext[Any] | None = None,
     ) -> AsyncIterator[StreamedResponse]:
-        """Delegate a streaming request to the inner model without retry.
+        """Open a streaming request on the inner model, retrying 429s at open time.
 
-        Streaming responses are stateful and cannot be safely replayed, so no
-        retry logic is applied here.
+        Opening the inner stream is retried exactly like :meth:`request`: the
+        provider rejects a rate-limited request before any chunk exists, so
+        replaying it is safe. Once the stream has been yielded to the caller,
+        errors propagate without retry. The rate limiter, if any, applies to
+        every attempt, and a concurrency slot is held for the stream's lifetime.
 
         Args:
             messages: The conversation messages to send.
             model_settings: Optional model-level settings.
             model_request_parameters: Parameters for this specific request.
+            run_context: The agent run context, passed through to the inner model.
 
         Yields:
             The :class:`~pydantic_ai.models.StreamedResponse` from the inner model.
+
+        Raises:
+            ModelHTTPError: Re-raised after all retries are exhausted, or immediately
+                for non-429 HTTP errors.
         """
-        async with self.inner.request_stream(
-            messages, model_settings, model_request_parameters
-        ) as stream:
-            yield stream
+        inner = self.inner
+        delay = self.base_delay
+        waited = 0.0
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            stack = contextlib.AsyncExitStack()
+            try:
+                await stack.enter_async_context(self._in_flight)
+                stream = await stack.enter_async_context(
+                    inner.request_stream(
+                        messages, model_settings, model_request_parameters, run_context
+                    )
+                )
+            except ModelHTTPError as exc:
+                # Release the concurrency slot before sleeping.
+                await stack.aclose()
+                slept = await self._back_off(exc, attempt, delay, waited)
+                if slept is None:
+                    raise
+                waited += slept
+                delay = min(delay * 2, self.max_delay)
+                continue
+            except BaseException:
+                await stack.aclose()
+                raise
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.on_success()
+            async with stack:
+                yield stream
+            return
+
+        # Unreachable — the loop always returns or raises, but satisfies type checkers.
+        raise RuntimeError("Retry loop exited unexpectedly")  # pragma: no cover
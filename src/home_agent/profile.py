@@ -4,14 +4,21 @@ Defines Pydantic models for user profiles and a ProfileManager class
 to handle database interactions via db.py.
 """
 
+import asyncio
 import logging
+from collections import OrderedDict
 from datetime import datetime, timezone
+from functools import partial
 from pathlib import Path
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
+from pydantic_core import to_json
 
-from home_agent.db import get_profile, save_profile
+from home_agent.db import DBTarget, append_profile_note, get_profile, open_db, save_profile
+
+if TYPE_CHECKING:
+    import aiosqlite
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +34,20 @@ _LOCALE_TO_LANGUAGE: dict[str, str] = {
 
 _DEFAULT_LANGUAGE = "English"
 
+# Timezone-aware "now" for profile timestamps; the partial skips rebuilding the
+# bound call on every save.
+_utcnow = partial(datetime.now, timezone.utc)
+
+# Resolved profiles kept in memory by ProfileManager, least recently used
+# evicted first.
+_PROFILE_CACHE_SIZE = 256
+
+# Minimum seconds before a failed delayed profile write is retried.
+_SAVE_RETRY_DELAY = 1.0
+
+# Language names resolve_language() can return, in mapping order.
+SUPPORTED_LANGUAGES: tuple[str, ...] = tuple(_LOCALE_TO_LANGUAGE.values())
+
 
 def resolve_language(language_code: str | None) -> str:
     """Map a Telegram language_code to a human-readable language name.
@@ -82,17 +103,50 @@ class UserProfile(BaseModel):
     notes: list[str] = []
     role: Literal["admin", "user", "read_only"] = "user"
 
+    # Last rendered "Current User Context" prompt block, with the notes list and
+    # the key it was built from. Not serialised; rebuilt whenever a
+    # prompt-relevant field changes.
+    _prompt_cache: tuple[list[str], tuple[object, ...], str] | None = PrivateAttr(default=None)
+    # Bumped by notes_changed() whenever notes is edited in place.
+    _notes_version: int = PrivateAttr(default=0)
+    # The notes list, its (length, version) and its "; "-joined form for the
+    # user context prompt. Not serialised; extended by update_user_note.
+    _notes_joined: tuple[list[str], tuple[int, int], str] | None = PrivateAttr(default=None)
+
+    def notes_changed(self) -> None:
+        """Mark ``notes`` as changed after it was edited in place.
+
+        Appending is detected without this; replacing or removing an entry in
+        the same list is not. Assigning a new list needs no call either.
+        """
+        self._notes_version += 1
+
+
+# pydantic-core entry points bound once, so the per-load/per-save hot paths skip
+# BaseModel.__init__ and the class attribute lookups.
+_validate_profile = UserProfile.__pydantic_validator__.validate_python
+_profile_to_json = UserProfile.__pydantic_serializer__.to_json
+
 
 class ProfileManager:
     """Manages user profiles with database persistence.
 
     Provides methods to get and save user profiles to the SQLite database,
-    with automatic creation of default profiles for new users.
+    with automatic creation of default profiles for new users. Use as an async
+    context manager (or call :meth:`connect`) to hold one connection for the
+    manager's lifetime.
+
+    With a ``save_delay``, :meth:`save` only updates the cache and schedules
+    the write; saves for the same user within the delay are coalesced into one
+    write of the latest state. :meth:`flush` (called by :meth:`close`) writes
+    anything still pending.
 
     Attributes:
         db_path: Path to the SQLite database file.
         default_profile: Template for creating default profiles when needed.
         admin_telegram_ids: Set of Telegram user IDs that receive the admin role.
+        save_delay: Seconds a save waits for further saves of the same user
+            before writing. 0 writes immediately.
     """
 
     def __init__(
@@ -101,6 +155,7 @@ class ProfileManager:
         *,
         default_profile: UserProfile | None = None,
         admin_telegram_ids: list[int] | None = None,
+        save_delay: float = 0.0,
     ) -> None:
         """Initialize the ProfileManager with database path and default profile.
 
@@ -108,10 +163,71 @@ class ProfileManager:
             db_path: Path to the SQLite database file.
             default_profile: Optional template for creating default profiles.
             admin_telegram_ids: Optional list of Telegram IDs to auto-assign admin role.
+            save_delay: Seconds to hold a save so later saves of the same user
+                are written together. Defaults to 0 (write on every save).
         """
         self.db_path = Path(db_path)
         self.default_profile = default_profile or self._create_default_profile()
         self.admin_telegram_ids: frozenset[int] = frozenset(admin_telegram_ids or [])
+        self._db: aiosqlite.Connection | None = None
+        # Resolved profiles by user_id, as last read from or written to the
+        # database, in LRU order. This process is the only writer, so entries
+        # only change through save() and append_note().
+        self._cache: OrderedDict[int, UserProfile] = OrderedDict()
+        # Cache-miss loads in progress, so concurrent get() calls for the same
+        # user share one database read (and one default-profile insert).
+        self._inflight: dict[int, asyncio.Task[UserProfile]] = {}
+        self.save_delay = save_delay
+        # Latest unwritten payload per user, the timer that will write it, and
+        # the user's delayed write currently in progress.
+        self._pending: dict[int, bytes] = {}
+        self._flush_timers: dict[int, asyncio.TimerHandle] = {}
+        self._flush_tasks: dict[int, asyncio.Task[None]] = {}
+
+    async def connect(self) -> None:
+        """Open a long-lived connection reused by every query until :meth:`close`.
+
+        Without it, each query opens and closes its own connection.
+        """
+        if self._db is None:
+            self._db = await open_db(self.db_path)
+
+    async def close(self) -> None:
+        """Write pending saves, then close the connection opened by :meth:`connect`.
+
+        Raises:
+            Exception: The first error from writing a pending save (see
+                :meth:`flush`). The connection is closed regardless.
+        """
+        try:
+            await self.flush()
+        finally:
+            if self._db is not None:
+                await self._db.close()
+                self._db = None
+
+    async def __aenter__(self) -> "ProfileManager":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    @property
+    def _target(self) -> DBTarget:
+        """The open connection if there is one, otherwise the database path."""
+        return self._db if self._db is not None else self.db_path
+
+    def _remember(self, profile: UserProfile) -> None:
+        """Cache a resolved profile as most recently used, evicting the oldest.
+
+        Args:
+            profile: The profile as it is now stored.
+        """
+        self._cache[profile.user_id] = profile
+        self._cache.move_to_end(profile.user_id)
+        if len(self._cache) > _PROFILE_CACHE_SIZE:
+            self._cache.popitem(last=False)
 
     def _create_default_profile(self) -> UserProfile:
         """Create a default UserProfile instance.
@@ -119,7 +235,7 @@ class ProfileManager:
         Returns:
             A new UserProfile with default settings.
         """
-        now = datetime.now(tz=timezone.utc)
+        now = _utcnow()
         return UserProfile(
             user_id=0,
             name=None,
@@ -154,46 +270,67 @@ class ProfileManager:
                 reply language on first profile creation. Ignored for existing profiles.
 
         Returns:
-            User profile from database or newly created default profile.
+            User profile from the cache or database, or a newly created default
+            profile. Repeat calls for a cached user return the same instance.
         """
-        profile_data = await get_profile(self.db_path, user_id=user_id)
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            self._cache.move_to_end(user_id)
+            return cached
+
+        load = self._inflight.get(user_id)
+        if load is None:
+            load = asyncio.ensure_future(self._load(user_id, language_code))
+            self._inflight[user_id] = load
+            load.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        # Shielded so one cancelled caller does not cancel the shared load.
+        return await asyncio.shield(load)
+
+    async def _load(self, user_id: int, language_code: str | None) -> UserProfile:
+        """Read a profile from the database, or create the default one.
+
+        Args:
+            user_id: Telegram user ID to load.
+            language_code: Telegram locale used to seed a new profile's language.
+
+        Returns:
+            The stored (and now cached) profile for ``user_id``.
+        """
+        # An evicted profile may still have a delayed write in progress or
+        # outstanding; the row must be current before it is read.
+        writing = self._flush_tasks.get(user_id)
+        if writing is not None:
+            await writing
+        await self._write_pending(user_id)
+        profile_data = await get_profile(self._target, user_id=user_id)
         if profile_data:
-            profile_dict = {**profile_data}
-            profile_dict["user_id"] = user_id
-
-            # Reconstruct nested models from stored dict data
-            if "media_preferences" in profile_dict and isinstance(
-                profile_dict["media_preferences"], dict
-            ):
-                profile_dict["media_preferences"] = MediaPreferences(
-                    **profile_dict["media_preferences"]
-                )
-            else:
-                profile_dict.setdefault(
-                    "media_preferences", MediaPreferences()
-                )
-
-            # Ensure datetime fields are present
-            if "created_at" not in profile_dict:
-                profile_dict["created_at"] = datetime.now(tz=timezone.utc)
-            if "updated_at" not in profile_dict:
-                profile_dict["updated_at"] = datetime.now(tz=timezone.utc)
-
-            profile = UserProfile(**profile_dict)
+            # user_id is the row key, not part of the stored blob. The validator
+            # builds nested models (media_preferences) from their dicts itself.
+            profile_data["user_id"] = user_id
+            # Rows written before timestamps were stored lack them.
+            if "created_at" not in profile_data or "updated_at" not in profile_data:
+                now = _utcnow()
+                profile_data.setdefault("created_at", now)
+                profile_data.setdefault("updated_at", now)
+
+            profile = _validate_profile(profile_data)
 
             # Auto-update role if admin list has changed
             expected_role = self._resolve_role(user_id, profile.role)
             if profile.role != expected_role:
                 profile = profile.model_copy(update={"role": expected_role})
-                await self.save(profile)
+                return await self.save(profile)
 
+            self._remember(profile)
             return profile
 
         # Create default profile for new user using the stored template
         logger.info("Creating default profile for user %s", user_id)
-        now = datetime.now(tz=timezone.utc)
+        now = _utcnow()
         reply_language = resolve_language(language_code)
         role = self._resolve_role(user_id)
+        # deep=True so the new profile never shares mutable fields (notes,
+        # media_preferences) with the template — tools mutate them in place.
         new_profile = self.default_profile.model_copy(
             update={
                 "user_id": user_id,
@@ -201,22 +338,174 @@ class ProfileManager:
                 "updated_at": now,
                 "reply_language": reply_language,
                 "role": role,
-            }
+            },
+            deep=True,
         )
-        await self.save(new_profile)
-        return new_profile
+        return await self.save(new_profile)
 
-    async def save(self, profile: UserProfile) -> None:
+    async def save(self, profile: UserProfile) -> UserProfile:
         """Save profile to database.
 
         Args:
             profile: User profile to save to database.
+
+        Returns:
+            The stored copy of the profile, carrying the new ``updated_at``.
+            This is the instance placed in the cache.
+        """
+        # Deep copy: the cached profile carries the stored timestamp and shares
+        # no mutable fields (notes, media_preferences) with the caller's
+        # instance, so later edits to it cannot reach the cache unsaved.
+        stored = profile.model_copy(update={"updated_at": _utcnow()}, deep=True)
+        # Encoded straight to JSON bytes by pydantic-core; user_id is the DB
+        # key rather than part of the data blob.
+        profile_data = _profile_to_json(stored, exclude={"user_id"})
+
+        if self.save_delay <= 0:
+            await save_profile(self._target, user_id=profile.user_id, data=profile_data)
+            # Cached only once written, so a failed save leaves the cache as is.
+            self._remember(stored)
+            logger.info("Saved profile for user %s", profile.user_id)
+            return stored
+
+        # Delayed saves are cached right away; a failed write stays pending
+        # and is retried (see _write_pending).
+        self._remember(stored)
+        self._pending[profile.user_id] = profile_data
+        self._schedule_write(profile.user_id, self.save_delay)
+        return stored
+
+    def _schedule_write(self, user_id: int, delay: float) -> None:
+        """Arm the timer that writes the user's pending save, unless one is armed.
+
+        Args:
+            user_id: The user whose pending save should be written.
+            delay: Seconds until the write starts.
+        """
+        if user_id not in self._flush_timers:
+            self._flush_timers[user_id] = asyncio.get_running_loop().call_later(
+                delay, self._start_delayed_write, user_id
+            )
+
+    def _start_delayed_write(self, user_id: int) -> None:
+        """Timer callback: write the user's pending save in a background task.
+
+        Args:
+            user_id: The user whose save delay elapsed.
+        """
+        task = asyncio.ensure_future(
+            self._write_delayed(user_id, self._flush_tasks.get(user_id))
+        )
+        self._flush_tasks[user_id] = task
+        task.add_done_callback(partial(self._forget_write, user_id))
+
+    def _forget_write(self, user_id: int, task: asyncio.Task[None]) -> None:
+        """Done callback: drop a finished delayed write unless a newer one replaced it.
+
+        Args:
+            user_id: The user the write belonged to.
+            task: The finished write task.
+        """
+        if self._flush_tasks.get(user_id) is task:
+            del self._flush_tasks[user_id]
+
+    async def _write_delayed(
+        self, user_id: int, previous: asyncio.Task[None] | None
+    ) -> None:
+        """Background body of a delayed write; failures are logged and retried.
+
+        Args:
+            user_id: The user whose pending save should be written.
+            previous: The user's earlier delayed write, if still running. It
+                finishes first so an older payload never lands last.
+        """
+        if previous is not None:
+            await previous
+        try:
+            await self._write_pending(user_id)
+        except Exception:
+            logger.exception(
+                "Failed to write delayed profile save for user %s; will retry", user_id
+            )
+
+    async def _write_pending(self, user_id: int) -> None:
+        """Write the user's pending save now, if there is one.
+
+        On failure the payload stays pending (unless a newer save replaced it)
+        and a retry is scheduled, so a change already reported as saved is not
+        dropped.
+
+        Args:
+            user_id: The user whose pending payload should be written.
+
+        Raises:
+            Exception: Whatever the database write raised.
+        """
+        timer = self._flush_timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+        profile_data = self._pending.pop(user_id, None)
+        if profile_data is None:
+            return
+        try:
+            await save_profile(self._target, user_id=user_id, data=profile_data)
+        except Exception:
+            self._pending.setdefault(user_id, profile_data)
+            self._schedule_write(user_id, max(self.save_delay, _SAVE_RETRY_DELAY))
+            raise
+        logger.info("Saved profile for user %s", user_id)
+
+    async def flush(self) -> None:
+        """Write every pending delayed save and wait for in-progress writes.
+
+        Raises:
+            Exception: The first error from writing a pending save. Failed saves
+                stay pending with a retry scheduled; further errors are logged.
         """
-        profile = profile.model_copy(update={"updated_at": datetime.now(tz=timezone.utc)})
-        # Use mode="json" so datetime objects are serialised to ISO strings
-        profile_data = profile.model_dump(mode="json")
-        # Remove user_id — it's stored as the DB key, not in the data blob
-        profile_data.pop("user_id", None)
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks.values())
+        first_error: Exception | None = None
+        for user_id in list(self._pending):
+            try:
+                await self._write_pending(user_id)
+            except Exception as exc:
+                if first_error is None:
+                    first_error = exc
+                else:
+                    logger.exception("Failed to write profile save for user %s", user_id)
+        if first_error is not None:
+            raise first_error
+
+    async def append_note(self, profile: UserProfile, note: str) -> UserProfile:
+        """Persist a single new note without re-serialising the whole profile.
+
+        The caller is expected to have already appended ``note`` to
+        ``profile.notes`` in memory. Falls back to a full :meth:`save` when
+        the profile has not been stored yet.
+
+        Args:
+            profile: The user's profile, already containing the new note.
+            note: The note text to append to the stored profile.
 
-        await save_profile(self.db_path, user_id=profile.user_id, data=profile_data)
-        logger.info("Saved profile for user %s", profile.user_id)
+        Returns:
+            The stored copy of the profile, as placed in the cache.
+        """
+        if profile.user_id in self._pending or profile.user_id in self._flush_tasks:
+            # The stored row is behind the pending or in-flight payload;
+            # appending to it would be overwritten. Fold the note into a save.
+            return await self.save(profile)
+        profile.notes_changed()
+        updated_at = _utcnow()
+        appended = await append_profile_note(
+            self._target,
+            user_id=profile.user_id,
+            note=note,
+            # Same form the serializer stores ("Z" for UTC), not isoformat().
+            updated_at=to_json(updated_at)[1:-1].decode(),
+        )
+        if not appended:
+            return await self.save(profile)
+        stored = profile.model_copy(update={"updated_at": updated_at}, deep=True)
+        self._remember(stored)
+        logger.info("Appended note to profile for user %s", profile.user_id)
+        return stored
@@ -4,6 +4,10 @@ These functions are registered as agent tools in agent.py via
 agent_instance.tool(func) after import. They must not import
 home_agent.agent to avoid circular imports.
 
+Tools persist an updated copy of ctx.deps.user_profile first and only then
+swap it in, so a failed save leaves the run's profile (and the cache) as
+they were.
+
 Adheres to home-agent coding standards: type hints, Google-style docstrings,
 async-first.
 """
@@ -35,10 +39,10 @@ async def set_movie_quality(
         Confirmation message.
     """
     profile = ctx.deps.user_profile
-    new_prefs = profile.media_preferences.model_copy(update={"movie_quality": quality})
-    new_profile = profile.model_copy(update={"media_preferences": new_prefs})
-    ctx.deps.user_profile = new_profile
-    await ctx.deps.profile_manager.save(new_profile)
+    prefs = profile.media_preferences.model_copy(update={"movie_quality": quality})
+    ctx.deps.user_profile = await ctx.deps.profile_manager.save(
+        profile.model_copy(update={"media_preferences": prefs})
+    )
     logger.info("Set movie quality to %s for user %s", quality, profile.user_id)
     return f"Got it! I'll request movies in {quality} from now on."
 
@@ -60,10 +64,10 @@ async def set_series_quality(
         Confirmation message.
     """
     profile = ctx.deps.user_profile
-    new_prefs = profile.media_preferences.model_copy(update={"series_quality": quality})
-    new_profile = profile.model_copy(update={"media_preferences": new_prefs})
-    ctx.deps.user_profile = new_profile
-    await ctx.deps.profile_manager.save(new_profile)
+    prefs = profile.media_preferences.model_copy(update={"series_quality": quality})
+    ctx.deps.user_profile = await ctx.deps.profile_manager.save(
+        profile.model_copy(update={"media_preferences": prefs})
+    )
     logger.info("Set series quality to %s for user %s", quality, profile.user_id)
     return f"Got it! I'll request series in {quality} from now on."
 
@@ -84,9 +88,9 @@ async def set_reply_language(ctx: RunContext[Any], language: str) -> str:
         Confirmation message in the new language.
     """
     profile = ctx.deps.user_profile
-    profile = profile.model_copy(update={"reply_language": language})
-    ctx.deps.user_profile = profile
-    await ctx.deps.profile_manager.save(profile)
+    ctx.deps.user_profile = await ctx.deps.profile_manager.save(
+        profile.model_copy(update={"reply_language": language})
+    )
     logger.info("Set reply language to %s for user %s", language, profile.user_id)
     return f"Understood! I'll reply in {language} from now on."
 
@@ -108,9 +112,9 @@ async def set_confirmation_mode(
         Confirmation message.
     """
     profile = ctx.deps.user_profile
-    profile = profile.model_copy(update={"confirmation_mode": mode})
-    ctx.deps.user_profile = profile
-    await ctx.deps.profile_manager.save(profile)
+    ctx.deps.user_profile = await ctx.deps.profile_manager.save(
+        profile.model_copy(update={"confirmation_mode": mode})
+    )
     logger.info("Set confirmation_mode to %s for user %s", mode, profile.user_id)
     if mode == "never":
         return "Got it! I'll request media immediately without asking for confirmation."
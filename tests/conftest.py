@@ -1,18 +1,34 @@
-import os
-from unittest.mock import patch
-
+import asyncio
+import shutil
+from collections.abc import Callable, Iterator
+from datetime import datetime, timezone
 from pathlib import Path
 
 import pytest
+from pydantic_ai import Agent
+from pydantic_ai.models.test import TestModel
 
+from home_agent.agent import AgentDeps, create_agent
 from home_agent.config import AppConfig
 from home_agent.db import init_db
 from home_agent.history import HistoryManager
-from home_agent.profile import ProfileManager
+from home_agent.profile import ProfileManager, UserProfile
 
+# Fixed timestamp for test profiles built by make_deps, so they are
+# deterministic across runs.
+_FIXED_NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
 
-@pytest.fixture
-def mock_env():
+
+@pytest.fixture(scope="session")
+def mock_env() -> Iterator[dict[str, str]]:
+    """Set the AppConfig environment variables, once for the session.
+
+    Only AppConfig's own variables are touched: any ambient values are unset
+    and the test values are set per key, all reverted at session end. The
+    rest of the process environment is left alone. Tests that need a
+    different value override it with the function-scoped ``monkeypatch``,
+    which restores the session value afterwards.
+    """
     env = {
         "TELEGRAM_BOT_TOKEN": "token",
         "OPENROUTER_API_KEY": "openrouter",
@@ -22,12 +38,17 @@ def mock_env():
         "DB_PATH": "data/test.db",
         "LOG_LEVEL": "INFO",
     }
-    with patch.dict(os.environ, env, clear=True):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for name in AppConfig.model_fields:
+            monkeypatch.delenv(name.upper(), raising=False)
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
         yield env
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_config() -> AppConfig:
+    """Build one AppConfig for the whole session; it is frozen, so sharing is safe."""
     return AppConfig(
         telegram_bot_token="token",
         openrouter_api_key="openrouter",
@@ -39,11 +60,38 @@ def mock_config() -> AppConfig:
     )
 
 
+@pytest.fixture(scope="session")
+def agent_instance() -> Agent[AgentDeps, str]:
+    """Build the agent once per session.
+
+    Tests swap in a TestModel with ``agent_instance.override(model=...)``, which
+    is context-local, so the shared agent itself is never modified.
+    """
+    return create_agent()
+
+
+@pytest.fixture(scope="module")
+def default_test_model() -> TestModel:
+    """A TestModel with default settings, shared by the tests of a module.
+
+    Tests that configure call_tools or custom output build their own.
+    """
+    return TestModel()
+
+
+@pytest.fixture(scope="session")
+def test_db_template(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Initialise the schema once per session for test_db to copy."""
+    template = tmp_path_factory.mktemp("db") / "template.db"
+    asyncio.run(init_db(template))
+    return template
+
+
 @pytest.fixture
-async def test_db(tmp_path: Path) -> Path:
-    """Create a temporary SQLite database for tests."""
+def test_db(tmp_path: Path, test_db_template: Path) -> Path:
+    """Create a temporary SQLite database for tests from the schema template."""
     db_path = tmp_path / "test.db"
-    await init_db(db_path)
+    shutil.copyfile(test_db_template, db_path)
     return db_path
 
 
@@ -101,3 +149,33 @@ async def history_manager(test_db: Path) -> HistoryManager:
         A HistoryManager instance configured for the test database.
     """
     return HistoryManager(test_db)
+
+
+@pytest.fixture
+def make_deps(
+    mock_config: AppConfig,
+    profile_manager: ProfileManager,
+    history_manager: HistoryManager,
+) -> Callable[..., AgentDeps]:
+    """Build AgentDeps for a test user on the test database managers.
+
+    Returns:
+        A factory taking ``user_id`` (default 123) and UserProfile field
+        overrides (``name`` defaults to "Alice") and returning AgentDeps.
+    """
+
+    def _make(user_id: int = 123, **profile_overrides: object) -> AgentDeps:
+        profile_overrides.setdefault("name", "Alice")
+        # Test-controlled values, so validation is skipped; model_construct
+        # still fills (copies of) the field defaults.
+        profile = UserProfile.model_construct(
+            user_id=user_id, created_at=_FIXED_NOW, updated_at=_FIXED_NOW, **profile_overrides
+        )
+        return AgentDeps(
+            config=mock_config,
+            profile_manager=profile_manager,
+            history_manager=history_manager,
+            user_profile=profile,
+        )
+
+    return _make
@@ -7,16 +7,19 @@ uses PydanticAI's TestModel throughout.
 
 from __future__ import annotations
 
-from datetime import datetime
+from collections.abc import Callable
+from operator import attrgetter
 from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from pydantic_ai import Agent, RunContext
+from pydantic_ai.messages import SystemPromptPart
 from pydantic_ai.models.test import TestModel
 
-from home_agent.agent import AgentDeps, create_agent
-from home_agent.config import AppConfig
-from home_agent.history import HistoryManager
-from home_agent.profile import ProfileManager, UserProfile
+from home_agent.agent import AgentDeps, create_agent, update_user_note
+from home_agent.mcp.guarded_toolset import GuardedToolset
+from home_agent.profile import MediaPreferences, ProfileManager
 
 
 # ---------------------------------------------------------------------------
@@ -36,8 +39,6 @@ def extract_system_prompt_text(result) -> str:
     Returns:
         Concatenated text from all SystemPromptPart objects.
     """
-    from pydantic_ai.messages import SystemPromptPart
-
     return " ".join(
         part.content
         for msg in result.all_messages()
@@ -46,37 +47,6 @@ def extract_system_prompt_text(result) -> str:
     )
 
 
-def make_agent_deps(
-    config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
-    user_id: int = 123,
-) -> AgentDeps:
-    """Build an AgentDeps with a pre-populated UserProfile.
-
-    Args:
-        config: Application configuration.
-        profile_manager: Manages user profile persistence.
-        history_manager: Manages conversation history.
-        user_id: Telegram user ID to use for the profile.
-
-    Returns:
-        Fully populated AgentDeps ready for agent.run().
-    """
-    profile = UserProfile(
-        user_id=user_id,
-        name="Alice",
-        created_at=datetime.now(),
-        updated_at=datetime.now(),
-    )
-    return AgentDeps(
-        config=config,
-        profile_manager=profile_manager,
-        history_manager=history_manager,
-        user_profile=profile,
-    )
-
-
 # ---------------------------------------------------------------------------
 # Tests
 # ---------------------------------------------------------------------------
@@ -90,351 +60,236 @@ def test_agent_instantiates() -> None:
 
 
 async def test_agent_has_update_user_note_tool(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
+    make_deps: Callable[..., AgentDeps],
+    agent_instance: Agent[AgentDeps, str],
+    default_test_model: TestModel,
 ) -> None:
     """update_user_note tool is registered on the agent."""
-    deps = make_agent_deps(mock_config, profile_manager, history_manager)
+    deps = make_deps()
 
-    agent_instance = create_agent()
-    m = TestModel()
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            await agent_instance.run("hello", deps=deps)
+    with agent_instance.override(model=default_test_model):
+        await agent_instance.run("hello", deps=deps)
 
-    assert m.last_model_request_parameters is not None
-    tool_names = [t.name for t in m.last_model_request_parameters.function_tools]
+    params = default_test_model.last_model_request_parameters
+    assert params is not None
+    tool_names = [t.name for t in params.function_tools]
     assert "update_user_note" in tool_names
 
 
 async def test_system_prompt_contains_user_profile(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
+    make_deps: Callable[..., AgentDeps],
+    agent_instance: Agent[AgentDeps, str],
+    default_test_model: TestModel,
 ) -> None:
     """Dynamic system prompt includes the user's name."""
-    deps = make_agent_deps(mock_config, profile_manager, history_manager)
+    deps = make_deps()
 
-    agent_instance = create_agent()
-    m = TestModel()
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            result = await agent_instance.run("hello", deps=deps)
+    with agent_instance.override(model=default_test_model):
+        result = await agent_instance.run("hello", deps=deps)
 
     all_system_text = extract_system_prompt_text(result)
     assert "Alice" in all_system_text
 
 
-async def test_update_user_note_tool_persists_note(
-    mock_config: AppConfig,
+def test_agent_deps_rejects_unknown_attributes(
+    make_deps: Callable[..., AgentDeps],
+) -> None:
+    """AgentDeps uses __slots__, so typos in attribute names fail loudly."""
+    deps = make_deps()
+    deps.confirmed = True
+    with pytest.raises(AttributeError):
+        deps.confirmd = True  # type: ignore[attr-defined]
+
+
+@pytest.mark.parametrize(
+    ("tool", "field", "message"),
+    [
+        ("update_user_note", "notes", "remember that I like sci-fi"),
+        # Simulates the agent setting quality after the NOT SET prompt instruction
+        ("set_movie_quality", "media_preferences.movie_quality", "I want to download Troy"),
+    ],
+)
+async def test_tool_mutates_deps_and_persists(
+    make_deps: Callable[..., AgentDeps],
     profile_manager: ProfileManager,
-    history_manager: HistoryManager,
+    agent_instance: Agent[AgentDeps, str],
+    tool: str,
+    field: str,
+    message: str,
 ) -> None:
-    """Calling update_user_note saves the note to the user profile via ProfileManager."""
-    deps = make_agent_deps(mock_config, profile_manager, history_manager, user_id=42)
+    """A profile tool called by the agent updates ctx.deps and persists via ProfileManager."""
+    deps = make_deps(user_id=42)
+    get_field = attrgetter(field)
+    assert not get_field(deps.user_profile)
 
     # Save the initial profile so ProfileManager.save() can update it
     await profile_manager.save(deps.user_profile)
 
-    agent_instance = create_agent()
-    m = TestModel(call_tools=["update_user_note"])
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            await agent_instance.run("remember that I like sci-fi", deps=deps)
-
-    # The profile in deps should have the note appended
-    assert len(deps.user_profile.notes) > 0
+    with agent_instance.override(model=TestModel(call_tools=[tool])):
+        await agent_instance.run(message, deps=deps)
 
-    # And the note should be persisted in the DB
-    saved_profile = await profile_manager.get(42)
-    assert len(saved_profile.notes) > 0
+    assert get_field(deps.user_profile)
+    assert get_field(await profile_manager.get(42))
 
 
-async def test_update_user_note_updates_deps(
-    mock_config: AppConfig,
+async def test_update_user_note_extends_notes_in_prompt(
+    make_deps: Callable[..., AgentDeps],
     profile_manager: ProfileManager,
-    history_manager: HistoryManager,
+    agent_instance: Agent[AgentDeps, str],
 ) -> None:
-    """update_user_note tool updates ctx.deps.user_profile.notes."""
-    deps = make_agent_deps(mock_config, profile_manager, history_manager, user_id=55)
+    """Notes added by update_user_note appear alongside existing notes in the prompt."""
+    deps = make_deps(user_id=56)
+    deps.user_profile.notes.append("Prefers subtitles")
     await profile_manager.save(deps.user_profile)
 
-    agent_instance = create_agent()
-    m = TestModel(call_tools=["update_user_note"])
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            await agent_instance.run("I love sci-fi movies", deps=deps)
-
-    assert len(deps.user_profile.notes) > 0
-
-
-async def test_agent_returns_output(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
-) -> None:
-    """Agent returns the custom_output_text when configured on TestModel."""
-    deps = make_agent_deps(mock_config, profile_manager, history_manager)
-
-    agent_instance = create_agent()
-    m = TestModel(custom_output_text="Hello from the agent!")
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            result = await agent_instance.run("hi", deps=deps)
-
-    assert result.output == "Hello from the agent!"
-
-
-async def test_dynamic_prompt_shows_not_set_when_quality_is_none(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
-) -> None:
-    """Dynamic prompt shows 'NOT SET' when movie/series quality is not configured."""
-    from home_agent.profile import MediaPreferences
-
-    # Profile with no quality set
-    profile = UserProfile(
-        user_id=99,
-        created_at=datetime.now(),
-        updated_at=datetime.now(),
-        media_preferences=MediaPreferences(movie_quality=None, series_quality=None),
-    )
-    deps = AgentDeps(
-        config=mock_config,
-        profile_manager=profile_manager,
-        history_manager=history_manager,
-        user_profile=profile,
-    )
-
-    agent_instance = create_agent()
-    m = TestModel()
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            result = await agent_instance.run("hello", deps=deps)
-
-    all_system_text = extract_system_prompt_text(result)
-    assert "NOT SET" in all_system_text
-
-
-async def test_dynamic_prompt_shows_language(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
-) -> None:
-    """Dynamic prompt includes the user's reply language."""
-    profile = UserProfile(
-        user_id=100,
-        created_at=datetime.now(),
-        updated_at=datetime.now(),
-        reply_language="Dutch",
-    )
-    deps = AgentDeps(
-        config=mock_config,
-        profile_manager=profile_manager,
-        history_manager=history_manager,
-        user_profile=profile,
-    )
-
-    agent_instance = create_agent()
-    m = TestModel()
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            result = await agent_instance.run("hello", deps=deps)
-
-    all_system_text = extract_system_prompt_text(result)
-    assert "Dutch" in all_system_text
-
+    with agent_instance.override(model=TestModel(call_tools=["update_user_note"])):
+        await agent_instance.run("I love sci-fi movies", deps=deps)
+    with agent_instance.override(model=TestModel(call_tools=[])):
+        result = await agent_instance.run("hello again", deps=deps)
 
-async def test_dynamic_prompt_shows_confirmation_mode(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
-) -> None:
-    """Dynamic prompt includes the confirmation mode."""
-    profile = UserProfile(
-        user_id=101,
-        created_at=datetime.now(),
-        updated_at=datetime.now(),
-        confirmation_mode="never",
-    )
-    deps = AgentDeps(
-        config=mock_config,
-        profile_manager=profile_manager,
-        history_manager=history_manager,
-        user_profile=profile,
-    )
+    assert len(deps.user_profile.notes) == 2
+    expected = "Notes about this user: " + "; ".join(deps.user_profile.notes)
+    assert expected in extract_system_prompt_text(result)
 
-    agent_instance = create_agent()
-    m = TestModel()
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            result = await agent_instance.run("hello", deps=deps)
 
-    all_system_text = extract_system_prompt_text(result)
-    assert "never" in all_system_text
-
-
-async def test_dynamic_prompt_shows_quality_when_set(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
+async def test_prompt_notes_follow_replaced_and_edited_notes(
+    make_deps: Callable[..., AgentDeps],
+    agent_instance: Agent[AgentDeps, str],
+    default_test_model: TestModel,
 ) -> None:
-    """Dynamic prompt shows quality values when they are configured."""
-    from home_agent.profile import MediaPreferences
-
-    profile = UserProfile(
-        user_id=102,
-        created_at=datetime.now(),
-        updated_at=datetime.now(),
-        media_preferences=MediaPreferences(movie_quality="4k", series_quality="1080p"),
-    )
-    deps = AgentDeps(
-        config=mock_config,
-        profile_manager=profile_manager,
-        history_manager=history_manager,
-        user_profile=profile,
-    )
+    """A same-length notes change via model_copy or notes_changed() is never stale."""
+    deps = make_deps(user_id=57, notes=["likes horror"])
+    with agent_instance.override(model=default_test_model):
+        await agent_instance.run("hello", deps=deps)
 
-    agent_instance = create_agent()
-    m = TestModel()
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            result = await agent_instance.run("hello", deps=deps)
-
-    all_system_text = extract_system_prompt_text(result)
-    assert "4k" in all_system_text
-    assert "1080p" in all_system_text
-    # The dynamic portion should NOT contain the "NOT SET" placeholder phrase
-    assert "NOT SET — ask the user before making any movie request" not in all_system_text
-    assert "NOT SET — ask the user before making any series request" not in all_system_text
-
-
-async def test_static_prompt_contains_media_request_instructions(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
-) -> None:
-    """Static system prompt contains key media request instructions."""
-    deps = make_agent_deps(mock_config, profile_manager, history_manager)
+        deps.user_profile = deps.user_profile.model_copy(update={"notes": ["hates horror"]})
+        result = await agent_instance.run("hello again", deps=deps)
+        prompt = extract_system_prompt_text(result)
+        assert "Notes about this user: hates horror" in prompt
+        assert "likes horror" not in prompt
 
-    agent_instance = create_agent()
-    m = TestModel()
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            result = await agent_instance.run("hello", deps=deps)
-
-    all_system_text = extract_system_prompt_text(result)
-    # Key structural instructions from the numbered media request flow
-    assert "search_media" in all_system_text
-    assert "SEARCH FIRST" in all_system_text
-    assert "DISAMBIGUATE" in all_system_text
-    assert "CONFIRM" in all_system_text
-    assert "quality" in all_system_text.lower()
+        deps.user_profile.notes[0] = "edited"
+        deps.user_profile.notes_changed()
+        result = await agent_instance.run("and again", deps=deps)
+        assert "Notes about this user: edited" in extract_system_prompt_text(result)
 
 
-async def test_set_movie_quality_tool_is_callable_when_quality_unset(
-    mock_config: AppConfig,
+async def test_update_user_note_failed_write_leaves_profile_unchanged(
+    make_deps: Callable[..., AgentDeps],
     profile_manager: ProfileManager,
-    history_manager: HistoryManager,
 ) -> None:
-    """Agent can call set_movie_quality tool when movie quality is not set.
-
-    This verifies the tool is registered and callable — simulating the
-    agent deciding to ask for quality during a media request.
-    """
-    from home_agent.profile import MediaPreferences
-    profile = UserProfile(
-        user_id=103,
-        created_at=datetime.now(),
-        updated_at=datetime.now(),
-        media_preferences=MediaPreferences(movie_quality=None),
-    )
-    await profile_manager.save(profile)
-
-    deps = AgentDeps(
-        config=mock_config,
-        profile_manager=profile_manager,
-        history_manager=history_manager,
-        user_profile=profile,
-    )
-
-    agent_instance = create_agent()
-    # TestModel configured to call set_movie_quality — simulates the agent
-    # deciding to set quality based on the NOT SET prompt instruction
-    m = TestModel(call_tools=["set_movie_quality"])
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            await agent_instance.run("I want to download Troy", deps=deps)
+    """If the note cannot be stored, the run's profile keeps its old notes."""
+    deps = make_deps(user_id=58, notes=["likes horror"])
+    await profile_manager.save(deps.user_profile)
+    profile = deps.user_profile
+    ctx = MagicMock(spec=RunContext)
+    ctx.deps = deps
 
-    # Tool should have updated movie_quality on the profile in deps
-    assert deps.user_profile.media_preferences.movie_quality is not None
+    with patch(
+        "home_agent.profile.append_profile_note", AsyncMock(side_effect=OSError("locked"))
+    ), pytest.raises(OSError):
+        await update_user_note(ctx, "hates horror")
 
-    # And persisted to DB
-    saved = await profile_manager.get(103)
-    assert saved.media_preferences.movie_quality is not None
+    assert deps.user_profile is profile
+    assert profile.notes == ["likes horror"]
+    assert (await profile_manager.get(58)).notes == ["likes horror"]
 
 
-async def test_static_prompt_contains_disambiguation_instructions(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
+async def test_agent_returns_output(
+    make_deps: Callable[..., AgentDeps],
+    agent_instance: Agent[AgentDeps, str],
 ) -> None:
-    """Static system prompt contains disambiguation instructions."""
-    deps = make_agent_deps(mock_config, profile_manager, history_manager)
+    """Agent returns the custom_output_text when configured on TestModel."""
+    deps = make_deps()
 
-    agent_instance = create_agent()
-    m = TestModel()
+    m = TestModel(custom_output_text="Hello from the agent!")
     with agent_instance.override(model=m):
-        async with agent_instance:
-            result = await agent_instance.run("hello", deps=deps)
+        result = await agent_instance.run("hi", deps=deps)
 
-    all_system_text = extract_system_prompt_text(result)
-    # Disambiguation instructions must be present
-    assert "DISAMBIGUATE" in all_system_text
-    assert "numbered list" in all_system_text
-    # Must never suggest exposing technical IDs
-    assert "TMDB" in all_system_text  # mentions to NEVER expose it
-    assert "technical identifiers" in all_system_text
+    assert result.output == "Hello from the agent!"
 
 
-async def test_static_prompt_handles_single_result_skip(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
+@pytest.mark.parametrize(
+    ("profile_kwargs", "expected"),
+    [
+        pytest.param(
+            {"media_preferences": MediaPreferences(movie_quality=None, series_quality=None)},
+            [("NOT SET", True)],
+            id="quality_not_set",
+        ),
+        pytest.param(
+            {"media_preferences": MediaPreferences(movie_quality="4k", series_quality="1080p")},
+            [
+                ("4k", True),
+                ("1080p", True),
+                ("NOT SET — ask the user before making any movie request", False),
+                ("NOT SET — ask the user before making any series request", False),
+            ],
+            id="quality_set",
+        ),
+        pytest.param({"reply_language": "Dutch"}, [("Dutch", True)], id="language"),
+        pytest.param(
+            {"confirmation_mode": "never"}, [("never", True)], id="confirmation_mode"
+        ),
+        pytest.param(
+            {},
+            [
+                # Media request flow
+                ("search_media", True),
+                ("SEARCH FIRST", True),
+                ("DISAMBIGUATE", True),
+                ("CONFIRM", True),
+                ("quality", True),
+                # Disambiguation, without exposing technical IDs
+                ("numbered list", True),
+                ("TMDB", True),
+                ("technical identifiers", True),
+                # Single clear match skips straight to the quality step
+                ("only ONE clear match", True),
+                # Sequels and franchises are always disambiguated
+                ("sequels and franchises", True),
+            ],
+            id="static_instructions",
+        ),
+    ],
+)
+async def test_system_prompt_contents(
+    make_deps: Callable[..., AgentDeps],
+    profile_kwargs: dict[str, object],
+    expected: list[tuple[str, bool]],
+    agent_instance: Agent[AgentDeps, str],
+    default_test_model: TestModel,
 ) -> None:
-    """Static system prompt instructs agent to skip disambiguation for single clear match."""
-    deps = make_agent_deps(mock_config, profile_manager, history_manager)
+    """The rendered system prompt contains (or omits) the expected text for a profile."""
+    deps = make_deps(user_id=99, **profile_kwargs)
 
-    agent_instance = create_agent()
-    m = TestModel()
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            result = await agent_instance.run("hello", deps=deps)
+    with agent_instance.override(model=default_test_model):
+        result = await agent_instance.run("hello", deps=deps)
 
     all_system_text = extract_system_prompt_text(result)
-    # Single match should skip to quality step
-    assert "ONE clear match" in all_system_text or "only ONE" in all_system_text
+    for needle, must_be_in in expected:
+        assert (needle in all_system_text) is must_be_in, needle
 
 
-async def test_static_prompt_handles_franchise_disambiguation(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
+async def test_dynamic_prompt_reflects_profile_changes_between_runs(
+    make_deps: Callable[..., AgentDeps],
+    agent_instance: Agent[AgentDeps, str],
+    default_test_model: TestModel,
 ) -> None:
-    """Static system prompt instructs agent to disambiguate sequels and franchises."""
-    deps = make_agent_deps(mock_config, profile_manager, history_manager)
+    """Cached user context is rebuilt when a prompt-relevant profile field changes."""
+    deps = make_deps()
 
-    agent_instance = create_agent()
-    m = TestModel()
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            result = await agent_instance.run("hello", deps=deps)
+    with agent_instance.override(model=default_test_model):
+        first = await agent_instance.run("hello", deps=deps)
+        deps.user_profile.reply_language = "French"
+        deps.user_profile.notes.append("Likes noir films")
+        second = await agent_instance.run("hello again", deps=deps)
 
-    all_system_text = extract_system_prompt_text(result)
-    # Franchise/sequel handling must be mentioned
-    assert "sequels" in all_system_text or "franchise" in all_system_text
+    first_text = extract_system_prompt_text(first)
+    second_text = extract_system_prompt_text(second)
+    assert "Reply language: English" in first_text
+    assert "Reply language: French" in second_text
+    assert "Likes noir films" in second_text
 
 
 # ---------------------------------------------------------------------------
@@ -448,10 +303,6 @@ async def test_create_agent_with_guarded_toolsets() -> None:
     Uses a real GuardedToolset wrapping a mocked inner toolset to exercise
     PydanticAI's AbstractToolset protocol check — not bypassed by MagicMock.
     """
-    from unittest.mock import AsyncMock, MagicMock
-
-    from home_agent.mcp.guarded_toolset import GuardedToolset
-
     inner = MagicMock()
     inner.id = "test-server"
     inner.__aenter__ = AsyncMock(return_value=inner)
@@ -478,21 +329,19 @@ def test_create_agent_with_none_toolsets() -> None:
 
 
 async def test_all_profile_tools_registered(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
+    make_deps: Callable[..., AgentDeps],
+    agent_instance: Agent[AgentDeps, str],
+    default_test_model: TestModel,
 ) -> None:
     """All expected profile tools are registered on the agent."""
-    deps = make_agent_deps(mock_config, profile_manager, history_manager)
+    deps = make_deps()
 
-    agent_instance = create_agent()
-    m = TestModel()
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            await agent_instance.run("hello", deps=deps)
+    with agent_instance.override(model=default_test_model):
+        await agent_instance.run("hello", deps=deps)
 
-    assert m.last_model_request_parameters is not None
-    tool_names = [t.name for t in m.last_model_request_parameters.function_tools]
+    params = default_test_model.last_model_request_parameters
+    assert params is not None
+    tool_names = [t.name for t in params.function_tools]
     expected_tools = [
         "update_user_note",
         "set_movie_quality",
@@ -507,18 +356,15 @@ async def test_all_profile_tools_registered(
 
 
 async def test_static_prompt_mentions_send_confirmation_keyboard(
-    mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
+    make_deps: Callable[..., AgentDeps],
+    agent_instance: Agent[AgentDeps, str],
+    default_test_model: TestModel,
 ) -> None:
     """Static system prompt mentions send_confirmation_keyboard (not confirm_request)."""
-    deps = make_agent_deps(mock_config, profile_manager, history_manager)
+    deps = make_deps()
 
-    agent_instance = create_agent()
-    m = TestModel()
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            result = await agent_instance.run("hello", deps=deps)
+    with agent_instance.override(model=default_test_model):
+        result = await agent_instance.run("hello", deps=deps)
 
     all_system_text = extract_system_prompt_text(result)
     assert "send_confirmation_keyboard" in all_system_text
@@ -5,15 +5,19 @@ Covers whitelist enforcement, typing indicator, and agent response behaviour.
 
 from __future__ import annotations
 
+from functools import lru_cache
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from pydantic_ai.exceptions import ModelHTTPError
 from telegram import CallbackQuery, Chat, Message, Update, User
 from telegram.constants import ChatAction, ParseMode
+from telegram.ext import CallbackQueryHandler
 
 from home_agent.bot import _split_message, create_application, make_callback_handler, make_message_handler
 from home_agent.config import AppConfig
-from home_agent.history import HistoryManager
+from home_agent.db import save_messages
+from home_agent.history import HISTORY_WINDOW_PAIRS, HistoryManager
 from home_agent.mcp.guarded_toolset import GuardedToolset
 from home_agent.profile import ProfileManager
 
@@ -23,6 +27,24 @@ from home_agent.profile import ProfileManager
 # ---------------------------------------------------------------------------
 
 
+# Attribute names for the Message/Update spec mocks, computed once. A class spec
+# would re-run dir() and per-attribute introspection on every mock.
+_MESSAGE_SPEC = dir(Message)
+_UPDATE_SPEC = dir(Update)
+
+
+@lru_cache(maxsize=None)
+def _test_user(user_id: int, language_code: str | None) -> User:
+    """Return a cached Telegram User (immutable, so safe to share between tests)."""
+    return User(id=user_id, is_bot=False, first_name="Test", language_code=language_code)
+
+
+@lru_cache(maxsize=None)
+def _test_chat(user_id: int) -> Chat:
+    """Return a cached private Telegram Chat (immutable, so safe to share between tests)."""
+    return Chat(id=user_id, type="private")
+
+
 def make_test_update(
     text: str, user_id: int = 123, language_code: str | None = "en"
 ) -> Update:
@@ -36,17 +58,17 @@ def make_test_update(
     Returns:
         A mock :class:`telegram.Update` object wired with AsyncMock reply methods.
     """
-    user = User(id=user_id, is_bot=False, first_name="Test", language_code=language_code)
-    chat = Chat(id=user_id, type="private")
+    user = _test_user(user_id, language_code)
+    chat = _test_chat(user_id)
 
-    message = MagicMock(spec=Message)
+    message = MagicMock(spec=_MESSAGE_SPEC)
     message.text = text
     message.from_user = user
     message.chat = chat
     message.chat_id = user_id
     message.reply_text = AsyncMock()
 
-    update = MagicMock(spec=Update)
+    update = MagicMock(spec=_UPDATE_SPEC)
     update.effective_user = user
     update.effective_message = message
     update.effective_chat = MagicMock()
@@ -56,6 +78,19 @@ def make_test_update(
     return update
 
 
+@pytest.fixture
+def mock_agent() -> MagicMock:
+    """A stand-in agent whose ``run`` is an AsyncMock.
+
+    Tests set ``mock_agent.run.return_value`` (or ``side_effect``) as needed.
+    """
+    agent = MagicMock()
+    agent.__aenter__ = AsyncMock(return_value=agent)
+    agent.__aexit__ = AsyncMock(return_value=False)
+    agent.run = AsyncMock()
+    return agent
+
+
 # ---------------------------------------------------------------------------
 # Tests
 # ---------------------------------------------------------------------------
@@ -66,15 +101,10 @@ async def test_authorized_user_gets_agent_response(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """Whitelisted user receives the agent's reply."""
-    mock_result = MagicMock()
-    mock_result.output = "Agent response"
-
-    mock_agent = MagicMock()
-    mock_agent.__aenter__ = AsyncMock(return_value=mock_agent)
-    mock_agent.__aexit__ = AsyncMock(return_value=False)
-    mock_agent.run = AsyncMock(return_value=mock_result)
+    mock_agent.run.return_value = MagicMock(output="Agent response")
 
     handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
     update = make_test_update("hello", user_id=123)
@@ -86,14 +116,14 @@ async def test_authorized_user_gets_agent_response(
 @pytest.mark.asyncio
 async def test_unauthorized_user_gets_rejection(
     mock_config: AppConfig,
-    profile_manager: ProfileManager,
-    history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """Non-whitelisted user receives the rejection message and no typing action."""
     update = make_test_update("hello", user_id=99999)
     context = MagicMock()
+    profile_manager = MagicMock(spec=ProfileManager)
+    history_manager = MagicMock(spec=HistoryManager)
 
-    mock_agent = MagicMock()
     handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
     await handler(update, context)
 
@@ -105,21 +135,82 @@ async def test_unauthorized_user_gets_rejection(
     # Typing indicator must NOT be sent for unauthorized users
     update.effective_chat.send_action.assert_not_called()
 
+    # Rejected before any profile, history or agent work
+    assert profile_manager.mock_calls == []
+    assert history_manager.mock_calls == []
+    mock_agent.run.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_whitespace_only_message_skips_agent(
+    mock_config: AppConfig,
+    profile_manager: ProfileManager,
+    history_manager: HistoryManager,
+    mock_agent: MagicMock,
+) -> None:
+    """A whitespace-only message neither runs the agent nor sends a typing action."""
+    handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
+    update = make_test_update("   \n ", user_id=123)
+    await handler(update, MagicMock())
+
+    mock_agent.run.assert_not_called()
+    update.effective_chat.send_action.assert_not_called()
+    update.message.reply_text.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_message_text_passed_to_agent_unstripped(
+    mock_config: AppConfig,
+    profile_manager: ProfileManager,
+    history_manager: HistoryManager,
+    mock_agent: MagicMock,
+) -> None:
+    """Surrounding whitespace only matters for the emptiness check, not the agent input."""
+    mock_agent.run.return_value = MagicMock(output="ok")
+
+    handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
+    await handler(make_test_update("  hello\n", user_id=123), MagicMock())
+
+    assert mock_agent.run.call_args.args[0] == "  hello\n"
+
+
+@pytest.mark.asyncio
+async def test_history_is_loaded_with_window_limit(
+    mock_config: AppConfig,
+    profile_manager: ProfileManager,
+    history_manager: HistoryManager,
+    mock_agent: MagicMock,
+) -> None:
+    """Only the last HISTORY_WINDOW_PAIRS turns are read and passed to the agent."""
+    await save_messages(
+        history_manager.db_path,
+        user_id=123,
+        messages=[
+            (role, f"{prefix}{i}")
+            for i in range(HISTORY_WINDOW_PAIRS + 5)
+            for role, prefix in (("user", "q"), ("assistant", "a"))
+        ],
+    )
+
+    mock_agent.run.return_value = MagicMock(output="ok")
+
+    handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
+    await handler(make_test_update("hello", user_id=123), MagicMock())
+
+    message_history = mock_agent.run.call_args.kwargs["message_history"]
+    assert len(message_history) == 2 * HISTORY_WINDOW_PAIRS
+    assert message_history[0].parts[0].content == "q5"
+
 
 @pytest.mark.asyncio
 async def test_typing_action_sent_before_response(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """Typing indicator is sent before the agent reply for authorized users."""
-    mock_result = MagicMock()
-    mock_result.output = "pong"
-
-    mock_agent = MagicMock()
-    mock_agent.__aenter__ = AsyncMock(return_value=mock_agent)
-    mock_agent.__aexit__ = AsyncMock(return_value=False)
-    mock_agent.run = AsyncMock(return_value=mock_result)
+    mock_agent.run.return_value = MagicMock(output="pong")
 
     handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
     update = make_test_update("ping", user_id=456)
@@ -129,18 +220,33 @@ async def test_typing_action_sent_before_response(
     update.message.reply_text.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_typing_action_failure_does_not_block_reply(
+    mock_config: AppConfig,
+    profile_manager: ProfileManager,
+    history_manager: HistoryManager,
+    mock_agent: MagicMock,
+) -> None:
+    """A failing typing indicator runs in the background and never blocks the reply."""
+    mock_agent.run.return_value = MagicMock(output="pong")
+
+    handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
+    update = make_test_update("ping", user_id=456)
+    update.effective_chat.send_action = AsyncMock(side_effect=RuntimeError("telegram down"))
+    await handler(update, MagicMock())
+
+    update.message.reply_text.assert_called_once_with("pong\n", parse_mode=ParseMode.HTML)
+
+
 @pytest.mark.asyncio
 async def test_new_user_gets_language_from_locale(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """New user with Dutch Telegram locale gets reply_language='Dutch'."""
-    mock_result = MagicMock()
-    mock_result.output = "Hallo!"
-
-    mock_agent = MagicMock()
-    mock_agent.run = AsyncMock(return_value=mock_result)
+    mock_agent.run.return_value = MagicMock(output="Hallo!")
 
     handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
     update = make_test_update("hallo", user_id=123, language_code="nl")
@@ -156,17 +262,13 @@ async def test_rate_limit_sends_busy_message(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """Bot sends busy message when rate limit is exhausted."""
-    from pydantic_ai.exceptions import ModelHTTPError
-
-    mock_agent = MagicMock()
-    mock_agent.run = AsyncMock(
-        side_effect=ModelHTTPError(
-            status_code=429,
-            model_name="test-model",
-            body={"message": "rate limited"},
-        )
+    mock_agent.run.side_effect = ModelHTTPError(
+        status_code=429,
+        model_name="test-model",
+        body={"message": "rate limited"},
     )
 
     handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
@@ -183,14 +285,11 @@ async def test_long_reply_is_split(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """Agent reply exceeding 4096 chars is sent as multiple messages."""
     long_reply = "a" * 5000
-    mock_result = MagicMock()
-    mock_result.output = long_reply
-
-    mock_agent = MagicMock()
-    mock_agent.run = AsyncMock(return_value=mock_result)
+    mock_agent.run.return_value = MagicMock(output=long_reply)
 
     handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
     update = make_test_update("hello", user_id=123)
@@ -199,18 +298,37 @@ async def test_long_reply_is_split(
     assert update.message.reply_text.call_count == 2
 
 
+@pytest.mark.asyncio
+async def test_long_reply_chunks_sent_in_order_and_turn_saved(
+    mock_config: AppConfig,
+    profile_manager: ProfileManager,
+    history_manager: HistoryManager,
+    mock_agent: MagicMock,
+) -> None:
+    """Reply chunks arrive in order and the turn is persisted alongside sending."""
+    long_reply = "a" * 4096 + "b" * 10
+    mock_agent.run.return_value = MagicMock(output=long_reply)
+
+    handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
+    update = make_test_update("hello", user_id=123)
+    await handler(update, MagicMock())
+
+    sent = [c.args[0] for c in update.message.reply_text.call_args_list]
+    assert sent[0].startswith("a")
+    assert sent[1].startswith("b")
+    history = await history_manager.get_history(user_id=123)
+    assert history[-1] == {"role": "assistant", "content": long_reply}
+
+
 @pytest.mark.asyncio
 async def test_short_reply_not_split(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """Agent reply within 4096 chars is sent as a single message."""
-    mock_result = MagicMock()
-    mock_result.output = "Short reply"
-
-    mock_agent = MagicMock()
-    mock_agent.run = AsyncMock(return_value=mock_result)
+    mock_agent.run.return_value = MagicMock(output="Short reply")
 
     handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
     update = make_test_update("hello", user_id=123)
@@ -224,19 +342,14 @@ async def test_existing_user_language_not_overwritten(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """Existing user's reply_language is not overwritten on subsequent messages."""
-    from home_agent.profile import resolve_language  # noqa: F401 – imported for clarity
-
     # Pre-create profile with French
     profile = await profile_manager.get(456, language_code="fr")
     assert profile.reply_language == "French"
 
-    mock_result = MagicMock()
-    mock_result.output = "Reply"
-
-    mock_agent = MagicMock()
-    mock_agent.run = AsyncMock(return_value=mock_result)
+    mock_agent.run.return_value = MagicMock(output="Reply")
 
     handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
     # Send message with different language_code — should NOT overwrite
@@ -258,13 +371,10 @@ async def test_all_reply_text_calls_use_html_parse_mode(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """All reply_text calls use parse_mode=ParseMode.HTML."""
-    mock_result = MagicMock()
-    mock_result.output = "Hello world"
-
-    mock_agent = MagicMock()
-    mock_agent.run = AsyncMock(return_value=mock_result)
+    mock_agent.run.return_value = MagicMock(output="Hello world")
 
     handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
     update = make_test_update("hello", user_id=123)
@@ -282,9 +392,9 @@ async def test_rejection_message_uses_html_parse_mode(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """Rejection message for unauthorized users uses parse_mode=HTML."""
-    mock_agent = MagicMock()
     handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
     update = make_test_update("hello", user_id=99999)
     await handler(update, MagicMock())
@@ -298,10 +408,10 @@ async def test_error_message_uses_html_parse_mode(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """Error messages use parse_mode=HTML."""
-    mock_agent = MagicMock()
-    mock_agent.run = AsyncMock(side_effect=Exception("boom"))
+    mock_agent.run.side_effect = Exception("boom")
 
     handler = make_message_handler(mock_config, profile_manager, history_manager, mock_agent)
     update = make_test_update("hello", user_id=123)
@@ -318,18 +428,16 @@ async def test_error_message_uses_html_parse_mode(
 
 def test_create_application_registers_callback_handler(
     mock_config: AppConfig,
+    mock_agent: MagicMock,
 ) -> None:
     """create_application registers a CallbackQueryHandler alongside the MessageHandler."""
-    from telegram.ext import CallbackQueryHandler as TgCallbackQueryHandler
-
     profile_manager = MagicMock()
     history_manager = MagicMock()
-    mock_agent = MagicMock()
 
     app = create_application(mock_config, profile_manager, history_manager, mock_agent)
 
     handler_types = [type(h) for h in app.handlers[0]]
-    assert TgCallbackQueryHandler in handler_types, (
+    assert CallbackQueryHandler in handler_types, (
         "CallbackQueryHandler not registered in create_application"
     )
 
@@ -378,12 +486,10 @@ async def test_callback_confirm_stores_pending_confirmation(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """'confirm:{mediaId}:{mediaType}' callback stores pending confirmation and runs agent."""
-    mock_result = MagicMock()
-    mock_result.output = "Request submitted!"
-    mock_agent = MagicMock()
-    mock_agent.run = AsyncMock(return_value=mock_result)
+    mock_agent.run.return_value = MagicMock(output="Request submitted!")
 
     pending: dict = {}
     handler = make_callback_handler(
@@ -409,10 +515,10 @@ async def test_callback_cancel_removes_pending_confirmation(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """'cancel' callback removes any pending confirmation for the user."""
     pending: dict = {123: (42, "movie")}  # Pre-existing pending confirmation
-    mock_agent = MagicMock()
     handler = make_callback_handler(
         mock_config, [], mock_agent, profile_manager, history_manager,
         pending_confirmations=pending,
@@ -431,9 +537,9 @@ async def test_callback_unauthorized_user_rejected(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """Unauthorized user's callback query is rejected."""
-    mock_agent = MagicMock()
     handler = make_callback_handler(
         mock_config, [], mock_agent, profile_manager, history_manager
     )
@@ -452,12 +558,10 @@ async def test_callback_confirm_runs_agent(
     mock_config: AppConfig,
     profile_manager: ProfileManager,
     history_manager: HistoryManager,
+    mock_agent: MagicMock,
 ) -> None:
     """'confirm' callback re-runs the agent with a synthetic message."""
-    mock_result = MagicMock()
-    mock_result.output = "Done!"
-    mock_agent = MagicMock()
-    mock_agent.run = AsyncMock(return_value=mock_result)
+    mock_agent.run.return_value = MagicMock(output="Done!")
 
     handler = make_callback_handler(
         mock_config, [], mock_agent, profile_manager, history_manager
@@ -1,4 +1,3 @@
-import os
 from unittest.mock import patch
 
 import pytest
@@ -7,9 +6,17 @@ from pydantic import ValidationError
 from home_agent.config import AppConfig, get_config
 
 
-def test_config_loads_valid_env(mock_env):
-    config = AppConfig()
-    assert config.allowed_telegram_ids == [123, 456]
+@pytest.fixture(scope="module")
+def app_config(mock_env: dict[str, str]) -> AppConfig:
+    """One AppConfig built from the test env, shared by the read-only tests.
+
+    The .env file is skipped so values come only from the test environment.
+    """
+    return AppConfig(_env_file=None)
+
+
+def test_config_loads_valid_env(app_config: AppConfig) -> None:
+    assert app_config.allowed_telegram_ids == [123, 456]
 
 
 def test_missing_required_vars():
@@ -23,13 +30,12 @@ def test_missing_required_vars():
                   allowed_telegram_ids=None)  # type: ignore[arg-type]
 
 
-def test_default_values(mock_env):
-    config = AppConfig()
-    assert config.log_level == "INFO"
+def test_default_values(app_config: AppConfig) -> None:
+    assert app_config.log_level == "INFO"
 
 
-def test_list_parsing(mock_env):
-    os.environ["ALLOWED_TELEGRAM_IDS"] = "[1,2]"
+def test_list_parsing(mock_env, monkeypatch):
+    monkeypatch.setenv("ALLOWED_TELEGRAM_IDS", "[1,2]")
     config = AppConfig()
     assert config.allowed_telegram_ids == [1, 2]
 
@@ -41,34 +47,63 @@ def test_singleton_pattern(mock_env):
     assert id(config1) == id(config2)
 
 
-def test_retry_config_defaults(mock_env: None) -> None:
+def test_retry_config_defaults(app_config: AppConfig) -> None:
     """Retry config fields have correct defaults."""
-    config = AppConfig()
-    assert config.llm_max_retries == 3
-    assert config.llm_retry_base_delay == 1.0
+    assert app_config.llm_max_retries == 3
+    assert app_config.llm_retry_base_delay == 1.0
+
+
+def test_retry_max_total_wait_default(app_config: AppConfig) -> None:
+    """llm_retry_max_total_wait defaults to 30.0."""
+    assert app_config.llm_retry_max_total_wait == 30.0
+
+
+def test_requests_per_minute_default_disabled(app_config: AppConfig) -> None:
+    """llm_requests_per_minute defaults to 0 (client-side pacing off)."""
+    assert app_config.llm_requests_per_minute == 0.0
+
 
+def test_max_concurrent_requests_default_disabled(app_config: AppConfig) -> None:
+    """llm_max_concurrent_requests defaults to 0 (no in-flight cap)."""
+    assert app_config.llm_max_concurrent_requests == 0
 
-def test_retry_max_delay_default(mock_env):
+
+def test_retry_max_delay_default(app_config: AppConfig) -> None:
     """llm_retry_max_delay defaults to 30.0."""
-    config = AppConfig()
-    assert config.llm_retry_max_delay == 30.0
+    assert app_config.llm_retry_max_delay == 30.0
 
 
-def test_admin_telegram_ids_default_empty(mock_env):
+def test_admin_telegram_ids_default_empty(app_config: AppConfig) -> None:
     """admin_telegram_ids defaults to an empty list."""
-    config = AppConfig()
-    assert config.admin_telegram_ids == []
+    assert app_config.admin_telegram_ids == []
 
 
-def test_admin_telegram_ids_parsed_from_env(mock_env):
+def test_admin_telegram_ids_parsed_from_env(mock_env, monkeypatch):
     """admin_telegram_ids is parsed correctly from env."""
-    import os
-    os.environ["ADMIN_TELEGRAM_IDS"] = "[111, 222]"
+    monkeypatch.setenv("ADMIN_TELEGRAM_IDS", "[111, 222]")
     config = AppConfig()
     assert config.admin_telegram_ids == [111, 222]
 
 
-def test_asr_url_default(mock_env: None) -> None:
+def test_asr_url_default(app_config: AppConfig) -> None:
     """asr_url defaults to the Qwen3-ASR container address."""
-    config = AppConfig()
-    assert config.asr_url == "http://qwen3-asr:8086"
+    assert app_config.asr_url == "http://qwen3-asr:8086"
+
+
+def test_allowed_telegram_ids_set(app_config: AppConfig) -> None:
+    """allowed_telegram_ids_set mirrors the whitelist and is computed once."""
+    assert app_config.allowed_telegram_ids_set == frozenset({123, 456})
+    assert app_config.allowed_telegram_ids_set is app_config.allowed_telegram_ids_set
+    assert "allowed_telegram_ids_set" not in app_config.model_dump()
+
+
+def test_config_is_frozen(app_config: AppConfig) -> None:
+    """AppConfig rejects attribute assignment after load."""
+    with pytest.raises(ValidationError):
+        app_config.log_level = "DEBUG"  # type: ignore[misc]
+
+
+def test_whitelist_is_frozenset(mock_config: AppConfig) -> None:
+    """The whitelist checked on every message is a frozenset, for O(1) lookups."""
+    assert isinstance(mock_config.allowed_telegram_ids_set, frozenset)
+    assert 123 in mock_config.allowed_telegram_ids_set
@@ -8,7 +8,15 @@ import pytest
 
 import aiosqlite
 
-from home_agent.db import get_history, get_profile, init_db, save_message, save_profile
+from home_agent.db import (
+    append_profile_note,
+    get_history,
+    get_profile,
+    init_db,
+    open_db,
+    save_message,
+    save_profile,
+)
 
 
 @pytest.mark.asyncio
@@ -63,3 +71,53 @@ async def test_profile_roundtrip(test_db: Path) -> None:
     stored = await get_profile(test_db, user_id=999)
 
     assert stored == payload
+
+
+@pytest.mark.asyncio
+async def test_save_profile_accepts_encoded_json(test_db: Path) -> None:
+    """A bytes payload is stored as-is and reads back as the same data."""
+    await save_profile(test_db, user_id=998, data=b'{"name":"Rovo","notes":[]}')
+
+    assert await get_profile(test_db, user_id=998) == {"name": "Rovo", "notes": []}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("payload", [{"name": "Rovo"}, {"name": "Rovo", "notes": None}])
+async def test_append_profile_note_creates_missing_notes(
+    test_db: Path, payload: dict[str, object]
+) -> None:
+    """A payload without a notes array gets one instead of silently dropping the note."""
+    await save_profile(test_db, user_id=997, data=payload)
+
+    appended = await append_profile_note(
+        test_db, user_id=997, note="Likes sci-fi", updated_at="2025-01-01T00:00:00Z"
+    )
+
+    assert appended
+    assert await get_profile(test_db, user_id=997) == {
+        "name": "Rovo",
+        "notes": ["Likes sci-fi"],
+        "updated_at": "2025-01-01T00:00:00Z",
+    }
+
+
+@pytest.mark.asyncio
+async def test_open_db_applies_wal_and_is_reusable(test_db: Path) -> None:
+    """open_db returns a WAL connection that the helpers reuse without closing."""
+    db = await open_db(test_db)
+    try:
+        cursor = await db.execute("PRAGMA journal_mode")
+        row = await cursor.fetchone()
+        await cursor.close()
+        assert row is not None and row[0] == "wal"
+
+        await save_message(db, user_id=7, role="user", content="hello")
+        await save_profile(db, user_id=7, data={"name": "Kim"})
+
+        assert await get_history(db, user_id=7) == [{"role": "user", "content": "hello"}]
+        assert await get_profile(db, user_id=7) == {"name": "Kim"}
+    finally:
+        await db.close()
+
+    # Writes made through the shared connection are visible to fresh ones.
+    assert await get_history(test_db, user_id=7) == [{"role": "user", "content": "hello"}]
@@ -5,16 +5,24 @@ from pathlib import Path
 import yaml
 import pytest
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML built without LibYAML
+    from yaml import SafeLoader  # type: ignore[assignment]
 
-@pytest.fixture
+
+@pytest.fixture(scope="session")
 def compose_config() -> dict:
-    """Load docker-compose.yml as a dict.
+    """Load docker-compose.yml as a dict, once per session.
 
     Returns:
         Parsed docker-compose configuration.
     """
-    compose_file = Path("deployment/docker-compose.yml")
-    return yaml.safe_load(compose_file.read_text())
+    try:
+        data = Path("deployment/docker-compose.yml").read_bytes()
+    except FileNotFoundError:
+        pytest.fail("deployment/docker-compose.yml not found")
+    return yaml.load(data, Loader=SafeLoader)
 
 
 def test_dockerfile_exists() -> None:
@@ -22,54 +30,52 @@ def test_dockerfile_exists() -> None:
     assert Path("Dockerfile").exists(), "Dockerfile not found in project root"
 
 
+def test_dockerfile_installs_uvloop_extra() -> None:
+    """Dockerfile installs the uvloop extra so main() runs on uvloop in production."""
+    sync_lines = [
+        line for line in Path("Dockerfile").read_text().splitlines()
+        if line.startswith("RUN uv sync")
+    ]
+    assert sync_lines
+    assert all("--extra uvloop" in line for line in sync_lines)
+
+
 def test_dockerignore_exists() -> None:
     """.dockerignore exists in project root."""
     assert Path(".dockerignore").exists(), ".dockerignore not found"
 
 
-def test_docker_compose_exists() -> None:
+def test_docker_compose_exists(compose_config: dict) -> None:
     """deployment/docker-compose.yml exists and is valid YAML."""
-    compose_file = Path("deployment/docker-compose.yml")
-    assert compose_file.exists(), "deployment/docker-compose.yml not found"
-
-    config = yaml.safe_load(compose_file.read_text())
+    assert "services" in compose_config
+    assert "home-agent" in compose_config["services"]
+    assert "seerr-mcp" in compose_config["services"]
 
-    assert "services" in config
-    assert "home-agent" in config["services"]
-    assert "seerr-mcp" in config["services"]
 
-
-def test_docker_compose_has_volume() -> None:
+def test_docker_compose_has_volume(compose_config: dict) -> None:
     """deployment/docker-compose.yml defines persistent volume."""
-    compose_file = Path("deployment/docker-compose.yml")
-    config = yaml.safe_load(compose_file.read_text())
-
-    assert "volumes" in config
-    assert "home-agent-data" in config["volumes"]
+    assert "volumes" in compose_config
+    assert "home-agent-data" in compose_config["volumes"]
 
 
-def test_docker_compose_has_network() -> None:
+def test_docker_compose_has_network(compose_config: dict) -> None:
     """deployment/docker-compose.yml defines shared network."""
-    compose_file = Path("deployment/docker-compose.yml")
-    config = yaml.safe_load(compose_file.read_text())
-
-    assert "networks" in config
-    assert "home-agent-network" in config["networks"]
+    assert "networks" in compose_config
+    assert "home-agent-network" in compose_config["networks"]
 
 
 def test_seerr_dockerfile_has_healthcheck() -> None:
     """seerr-mcp Dockerfile defines a HEALTHCHECK instruction."""
-    dockerfile = Path("mcp_servers/seerr/Dockerfile")
-    assert dockerfile.exists(), "mcp_servers/seerr/Dockerfile not found"
-    assert "HEALTHCHECK" in dockerfile.read_text()
+    try:
+        data = Path("mcp_servers/seerr/Dockerfile").read_bytes()
+    except FileNotFoundError:
+        pytest.fail("mcp_servers/seerr/Dockerfile not found")
+    assert b"HEALTHCHECK" in data
 
 
-def test_docker_compose_home_agent_depends_on_mcp() -> None:
+def test_docker_compose_home_agent_depends_on_mcp(compose_config: dict) -> None:
     """home-agent depends_on seerr-mcp."""
-    compose_file = Path("deployment/docker-compose.yml")
-    config = yaml.safe_load(compose_file.read_text())
-
-    home_agent = config["services"]["home-agent"]
+    home_agent = compose_config["services"]["home-agent"]
     assert "depends_on" in home_agent
     assert "seerr-mcp" in home_agent["depends_on"]
 
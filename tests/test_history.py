@@ -2,21 +2,30 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+from functools import lru_cache
 from pathlib import Path
+from unittest.mock import AsyncMock, patch
 
 import pytest
 
 from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, UserPromptPart, TextPart, ToolCallPart, ToolReturnPart
 
+from home_agent.db import save_messages
 from home_agent.history import HistoryManager, convert_history_to_messages, sliding_window_processor
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
 
+@lru_cache(maxsize=None)
 def _make_pair(user_text: str = "hello", assistant_text: str = "hi") -> tuple[ModelRequest, ModelResponse]:
     """Create a matching ModelRequest/ModelResponse pair.
 
+    Cached per content, so the same message objects are shared across tests.
+    Tests must not mutate them; sliding_window_processor only slices.
+
     Args:
         user_text: Content for the user prompt part.
         assistant_text: Content for the assistant text part.
@@ -38,12 +47,11 @@ def _make_messages(num_pairs: int) -> list[ModelMessage]:
     Returns:
         Flat list with num_pairs * 2 ModelMessage objects.
     """
-    messages: list[ModelMessage] = []
-    for i in range(num_pairs):
-        req, resp = _make_pair(f"user message {i}", f"assistant reply {i}")
-        messages.append(req)
-        messages.append(resp)
-    return messages
+    return [
+        message
+        for i in range(num_pairs)
+        for message in _make_pair(f"user message {i}", f"assistant reply {i}")
+    ]
 
 
 # ── HistoryManager tests ──────────────────────────────────────────────────────
@@ -81,9 +89,15 @@ async def test_history_manager_full_history_preserved(test_db: Path) -> None:
     user_id = 42
 
     num_messages = 25
-    for i in range(num_messages):
-        role = "user" if i % 2 == 0 else "assistant"
-        await manager.save_message(user_id=user_id, role=role, content=f"message {i}")
+    # Seeded in one transaction; the read path is what is under test.
+    await save_messages(
+        test_db,
+        user_id=user_id,
+        messages=[
+            ("user" if i % 2 == 0 else "assistant", f"message {i}")
+            for i in range(num_messages)
+        ],
+    )
 
     history = await manager.get_history(user_id=user_id)
 
@@ -99,8 +113,9 @@ async def test_history_manager_limit(test_db: Path) -> None:
     manager = HistoryManager(test_db)
     user_id = 7
 
-    for i in range(10):
-        await manager.save_message(user_id=user_id, role="user", content=f"msg {i}")
+    await save_messages(
+        test_db, user_id=user_id, messages=[("user", f"msg {i}") for i in range(10)]
+    )
 
     history = await manager.get_history(user_id=user_id, limit=3)
 
@@ -126,77 +141,151 @@ async def test_history_manager_isolates_users(test_db: Path) -> None:
     assert history_2[0]["content"] == "user two message"
 
 
-# ── sliding_window_processor tests ───────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_history_manager_save_turn(test_db: Path) -> None:
+    """save_turn stores the user message followed by the assistant reply."""
+    manager = HistoryManager(test_db)
 
+    await manager.save_turn(user_id=9, user_text="ping", assistant_text="pong")
 
-def test_sliding_window_returns_last_n_pairs() -> None:
-    """Apply sliding_window_processor(n=5) to 10 pairs; only last 5 pairs returned."""
-    messages = _make_messages(10)
-    processor = sliding_window_processor(n=5)
+    assert await manager.get_history(user_id=9) == [
+        {"role": "user", "content": "ping"},
+        {"role": "assistant", "content": "pong"},
+    ]
 
-    result = processor(messages)
 
-    assert len(result) == 10  # 5 pairs × 2 messages each
-    # The last 5 pairs correspond to messages[10:] from original list
-    assert result == messages[10:]
+@pytest.mark.asyncio
+async def test_history_manager_context_reuses_one_connection(test_db: Path) -> None:
+    """Inside ``async with`` the manager holds one connection and closes it on exit."""
+    async with HistoryManager(test_db) as manager:
+        connection = manager._db
+        assert connection is not None
+        await manager.save_message(user_id=5, role="user", content="hi")
+        assert await manager.get_history(user_id=5) == [{"role": "user", "content": "hi"}]
+        assert manager._db is connection
 
+    assert manager._db is None
+    assert await manager.get_history(user_id=5) == [{"role": "user", "content": "hi"}]
 
-def test_sliding_window_does_not_split_pairs() -> None:
-    """Window boundary never leaves a lone ModelRequest without its ModelResponse."""
-    messages = _make_messages(6)  # 6 complete pairs
-    processor = sliding_window_processor(n=3)
 
-    result = processor(messages)
+@pytest.mark.asyncio
+async def test_history_manager_write_behind_reads_own_writes(test_db: Path) -> None:
+    """With write_behind, queued turns are visible to reads and flushed on close."""
+    async with HistoryManager(test_db, write_behind=True) as manager:
+        await manager.save_turn(user_id=11, user_text="first", assistant_text="one")
+        assert await manager.get_history(user_id=11) == [
+            {"role": "user", "content": "first"},
+            {"role": "assistant", "content": "one"},
+        ]
+        await manager.save_turn(user_id=11, user_text="second", assistant_text="two")
 
-    # Result must contain complete pairs only
-    assert len(result) % 2 == 0
-    for i in range(0, len(result), 2):
-        assert isinstance(result[i], ModelRequest), f"Expected ModelRequest at index {i}"
-        assert isinstance(result[i + 1], ModelResponse), f"Expected ModelResponse at index {i + 1}"
+    # The second turn was still queued when the manager closed.
+    history = await HistoryManager(test_db).get_history(user_id=11)
+    assert [entry["content"] for entry in history] == ["first", "one", "second", "two"]
 
 
-def test_sliding_window_n_larger_than_history() -> None:
-    """When n > available pairs, all messages are returned unchanged."""
-    messages = _make_messages(3)
-    processor = sliding_window_processor(n=10)
+@pytest.mark.asyncio
+async def test_history_manager_read_waits_only_for_own_queued_rows(test_db: Path) -> None:
+    """A read does not wait for rows other users still have queued."""
+    async with HistoryManager(test_db, write_behind=True) as manager:
+        assert manager._writer is not None
+        await manager.save_turn(user_id=12, user_text="other", assistant_text="user")
+        with patch.object(manager._writer, "wait_for_user", AsyncMock()) as wait_for_user:
+            assert await manager.get_history(user_id=13) == []
+        wait_for_user.assert_not_awaited()
 
-    result = processor(messages)
 
-    assert result == messages
-    assert len(result) == 6  # 3 pairs × 2
+@pytest.mark.asyncio
+async def test_history_manager_stopped_writer_does_not_hang(test_db: Path) -> None:
+    """If the writer task has died, queued rows are written directly instead of awaited."""
+    async with HistoryManager(test_db, write_behind=True) as manager:
+        assert manager._writer is not None and manager._writer_task is not None
+        manager._writer_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await manager._writer_task
+        manager._writer.enqueue(14, "user", "queued")
 
+        await manager.save_turn(user_id=14, user_text="direct", assistant_text="reply")
+        history = await asyncio.wait_for(manager.get_history(user_id=14), timeout=1)
 
-def test_sliding_window_empty_history() -> None:
-    """Empty list in, empty list out."""
-    processor = sliding_window_processor(n=5)
+    assert [entry["content"] for entry in history] == ["queued", "direct", "reply"]
 
-    result = processor([])
 
-    assert result == []
+# ── sliding_window_processor tests ───────────────────────────────────────────
 
 
-def test_sliding_window_n_equals_pairs() -> None:
-    """When n equals the number of pairs, all messages are returned."""
-    messages = _make_messages(4)
-    processor = sliding_window_processor(n=4)
+@pytest.fixture(scope="module")
+def big_history() -> list[ModelMessage]:
+    """Ten request/response pairs shared by the slicing tests.
+
+    Returns:
+        Flat list of 20 alternating ModelRequest/ModelResponse messages.
+    """
+    return _make_messages(10)
+
+
+@pytest.mark.parametrize(
+    ("n", "num_pairs", "expected_slice"),
+    [
+        pytest.param(5, 10, slice(-10, None), id="last-n-pairs"),
+        pytest.param(3, 6, slice(-6, None), id="does-not-split-pairs"),
+        pytest.param(10, 3, slice(None), id="n-larger-than-history"),
+        pytest.param(4, 4, slice(None), id="n-equals-pairs"),
+        pytest.param(1, 5, slice(-2, None), id="n-one"),
+        pytest.param(5, 0, slice(None), id="empty-history"),
+    ],
+)
+def test_sliding_window_keeps_last_n_pairs(
+    big_history: list[ModelMessage], n: int, num_pairs: int, expected_slice: slice
+) -> None:
+    """The window is a tail slice of whole request/response pairs."""
+    messages = big_history[len(big_history) - 2 * num_pairs:]
+    processor = sliding_window_processor(n=n)
 
     result = processor(messages)
 
-    assert result == messages
+    assert result == messages[expected_slice]
+    for i in range(0, len(result), 2):
+        assert isinstance(result[i], ModelRequest), f"Expected ModelRequest at index {i}"
+        assert isinstance(result[i + 1], ModelResponse), f"Expected ModelResponse at index {i + 1}"
+
 
+def test_sliding_window_keeps_trailing_request() -> None:
+    """The in-progress trailing request is kept after the last n pairs."""
+    messages = _make_messages(4)
+    current = ModelRequest(parts=[UserPromptPart(content="current")])
+    processor = sliding_window_processor(n=2)
 
-def test_sliding_window_n_one() -> None:
-    """With n=1, only the last pair is returned."""
-    messages = _make_messages(5)
-    processor = sliding_window_processor(n=1)
+    result = processor([*messages, current])
 
-    result = processor(messages)
+    assert result == [*messages[-4:], current]
 
-    assert len(result) == 2
-    assert isinstance(result[0], ModelRequest)
-    assert isinstance(result[1], ModelResponse)
-    # Should be the very last pair
-    assert result == messages[-2:]
+
+def test_sliding_window_skips_irregular_messages() -> None:
+    """A stray response or orphan request mid-history does not cut the window short."""
+    q0, a0 = _make_pair("q0", "a0")
+    q1, a1 = _make_pair("q1", "a1")
+    q2, a2 = _make_pair("q2", "a2")
+    stray = ModelResponse(parts=[TextPart(content="stray")])
+    orphan = ModelRequest(parts=[UserPromptPart(content="orphan")])
+    current = ModelRequest(parts=[UserPromptPart(content="current")])
+    processor = sliding_window_processor(n=5)
+
+    result = processor([q0, a0, stray, q1, a1, orphan, q2, a2, current])
+
+    assert result == [q0, a0, q1, a1, q2, a2, current]
+
+
+def test_sliding_window_skipped_messages_do_not_count_towards_n() -> None:
+    """Only complete pairs count towards n; the stray response is dropped."""
+    q1, a1 = _make_pair("q1", "a1")
+    q2, a2 = _make_pair("q2", "a2")
+    stray = ModelResponse(parts=[TextPart(content="a1 duplicate")])
+    current = ModelRequest(parts=[UserPromptPart(content="current")])
+    messages: list[ModelMessage] = [q1, a1, stray, q2, a2, current]
+
+    assert sliding_window_processor(n=5)(messages) == [q1, a1, q2, a2, current]
+    assert sliding_window_processor(n=1)(messages) == [q2, a2, current]
 
 
 def test_sliding_window_tool_call_pairs_not_split() -> None:
@@ -11,6 +11,7 @@ from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from pydantic_ai import Agent
 from pydantic_ai.models.test import TestModel
 from telegram import Chat, Message, Update, User
 
@@ -230,6 +231,7 @@ async def test_agent_deps_include_user_profile(
 async def test_set_movie_quality_tool_persists_via_full_agent(
     integration_config: AppConfig,
     integration_db: Path,
+    agent_instance: Agent[AgentDeps, str],
 ) -> None:
     """set_movie_quality tool called by real agent persists quality to DB.
 
@@ -248,7 +250,6 @@ async def test_set_movie_quality_tool_persists_via_full_agent(
     )
     await profile_manager.save(profile)
 
-    agent_instance = create_agent()
     # TestModel configured to call set_movie_quality
     m = TestModel(call_tools=["set_movie_quality"])
 
@@ -604,6 +605,7 @@ async def test_guarded_toolset_framework_boundary(
 async def test_language_switch_persists_across_messages(
     integration_config: AppConfig,
     integration_db: Path,
+    agent_instance: Agent[AgentDeps, str],
 ) -> None:
     """set_reply_language tool call persists language change for next message.
 
@@ -621,7 +623,6 @@ async def test_language_switch_persists_across_messages(
     )
     await profile_manager.save(profile)
 
-    agent_instance = create_agent()
     # TestModel calls set_reply_language
     m = TestModel(call_tools=["set_reply_language"])
 
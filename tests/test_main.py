@@ -2,10 +2,13 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import os
+import signal
 from unittest.mock import MagicMock, patch
 
-from home_agent.main import main, setup_logging
+from home_agent.main import _wait_for_stop_signal, main, setup_logging
 
 
 def test_setup_logging_sets_level() -> None:
@@ -26,6 +29,7 @@ def test_main_wires_components() -> None:
     # MagicMock, not a coroutine — prevents the unawaited-coroutine RuntimeWarning.
     mock_async_main = MagicMock()
     with patch("home_agent.main._async_main", mock_async_main), \
+         patch("home_agent.main.uvloop", None), \
          patch("home_agent.main.asyncio.run") as mock_asyncio_run:
         main()
         mock_asyncio_run.assert_called_once()
@@ -33,8 +37,33 @@ def test_main_wires_components() -> None:
         mock_async_main.assert_called_once()
 
 
+def test_main_prefers_uvloop_when_installed() -> None:
+    """main() runs the event loop through uvloop.run when uvloop is importable."""
+    mock_async_main = MagicMock()
+    mock_uvloop = MagicMock()
+    with patch("home_agent.main._async_main", mock_async_main), \
+         patch("home_agent.main.uvloop", mock_uvloop), \
+         patch("home_agent.main.asyncio.run") as mock_asyncio_run:
+        main()
+    mock_uvloop.run.assert_called_once_with(mock_async_main.return_value)
+    mock_asyncio_run.assert_not_called()
+
+
 def test_main_keyboard_interrupt_handled() -> None:
     """main() catches KeyboardInterrupt from asyncio.run and shuts down gracefully."""
-    with patch("home_agent.main.asyncio.run", side_effect=KeyboardInterrupt):
+    with patch("home_agent.main.uvloop", None), \
+         patch("home_agent.main.asyncio.run", side_effect=KeyboardInterrupt):
         # Should NOT raise — KeyboardInterrupt is caught inside main()
         main()
+
+
+def test_wait_for_stop_signal_returns_on_sigterm() -> None:
+    """_wait_for_stop_signal() returns once SIGTERM is delivered to the process."""
+
+    async def _run() -> None:
+        waiter = asyncio.create_task(_wait_for_stop_signal())
+        await asyncio.sleep(0)
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.wait_for(waiter, timeout=1)
+
+    asyncio.run(_run())
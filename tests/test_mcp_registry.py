@@ -50,6 +50,37 @@ def test_get_toolsets_returns_guarded_toolsets() -> None:
     assert toolsets[0].inner_toolset is mock_inner
 
 
+def test_get_toolsets_reuses_toolset_per_server() -> None:
+    """get_toolsets() builds each server's toolset once and reuses it."""
+    registry = MCPRegistry()
+    registry.register(
+        ServerConfig(name="seerr", url="http://localhost:8085/mcp", enabled=True)
+    )
+    with patch("home_agent.mcp.registry.FastMCPToolset") as mock_fastmcp:
+        first = registry.get_toolsets()
+        second = registry.get_toolsets()
+
+    mock_fastmcp.assert_called_once()
+    assert first[0] is second[0]
+
+
+def test_register_replaces_cached_toolset() -> None:
+    """Re-registering a server name rebuilds its toolset with the new URL."""
+    registry = MCPRegistry()
+    registry.register(
+        ServerConfig(name="seerr", url="http://localhost:8085/mcp", enabled=True)
+    )
+    with patch("home_agent.mcp.registry.FastMCPToolset") as mock_fastmcp:
+        registry.get_toolsets()
+        registry.register(
+            ServerConfig(name="seerr", url="http://localhost:9090/mcp", enabled=True)
+        )
+        registry.get_toolsets()
+
+    assert mock_fastmcp.call_count == 2
+    mock_fastmcp.assert_called_with("http://localhost:9090/mcp")
+
+
 def test_get_toolsets_excludes_disabled_servers() -> None:
     """get_toolsets() excludes disabled servers."""
     registry = MCPRegistry()
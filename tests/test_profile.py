@@ -4,9 +4,11 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 from pathlib import Path
+from unittest.mock import AsyncMock, patch
 
 import pytest
 
+from home_agent.db import get_profile, save_profile
 from home_agent.profile import MediaPreferences, ProfileManager, UserProfile, resolve_language
 
 
@@ -146,6 +148,296 @@ async def test_profile_manager_saves_notes(test_db: Path) -> None:
     assert reloaded.notes == ["Prefers evenings"]
 
 
+@pytest.mark.asyncio
+async def test_profile_manager_serves_repeat_reads_from_cache(test_db: Path) -> None:
+    """Known profiles are read from the database once, and the cache tracks writes."""
+    manager = ProfileManager(test_db)
+    await manager.get(310)  # creates and caches the profile
+    profile = await manager.get(310)
+    profile.notes.append("Watches anime")
+    await manager.append_note(profile, "Watches anime")
+
+    with patch("home_agent.profile.get_profile", new=AsyncMock()) as mock_get_profile:
+        reloaded = await manager.get(310)
+
+    mock_get_profile.assert_not_called()
+    assert reloaded.notes == ["Watches anime"]
+    assert (await ProfileManager(test_db).get(310)).notes == ["Watches anime"]
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_append_note_preserves_other_fields(test_db: Path) -> None:
+    """append_note adds the note in place without clobbering other stored fields."""
+    manager = ProfileManager(test_db)
+    user_id = 301
+
+    profile = await manager.get(user_id)
+    profile = profile.model_copy(
+        update={"notes": ["Prefers evenings"], "reply_language": "Dutch"}
+    )
+    await manager.save(profile)
+
+    profile.notes.append("Likes sci-fi")
+    await manager.append_note(profile, "Likes sci-fi")
+
+    reloaded = await manager.get(user_id)
+    assert reloaded.notes == ["Prefers evenings", "Likes sci-fi"]
+    assert reloaded.reply_language == "Dutch"
+    assert reloaded.updated_at.tzinfo is not None
+    # Stored in the serializer's form, like a full save.
+    stored = await get_profile(test_db, user_id=user_id)
+    assert stored is not None
+    assert stored["updated_at"].endswith("Z")
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_cache_returns_same_instance(test_db: Path) -> None:
+    """Repeat get() calls return the cached UserProfile instead of rebuilding it."""
+    manager = ProfileManager(test_db)
+    first = await manager.get(311)
+    assert await manager.get(311) is first
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_coalesces_concurrent_loads(test_db: Path) -> None:
+    """Concurrent get() calls for an uncached user share one read and one insert."""
+    import asyncio
+
+    from home_agent import profile as profile_module
+
+    manager = ProfileManager(test_db)
+    with patch.object(
+        profile_module, "get_profile", wraps=profile_module.get_profile
+    ) as spy_get, patch.object(
+        profile_module, "save_profile", wraps=profile_module.save_profile
+    ) as spy_save:
+        profiles = await asyncio.gather(*(manager.get(312) for _ in range(5)))
+
+    assert spy_get.await_count == 1
+    assert spy_save.await_count == 1
+    assert all(p is profiles[0] for p in profiles)
+    assert manager._inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_save_delay_coalesces_writes(test_db: Path) -> None:
+    """Saves within save_delay become one write of the latest state."""
+    from home_agent import profile as profile_module
+
+    manager = ProfileManager(test_db, save_delay=60.0)
+    profile = _make_profile(user_id=313)
+    with patch.object(
+        profile_module, "save_profile", wraps=profile_module.save_profile
+    ) as spy_save:
+        profile.media_preferences.movie_quality = "4k"
+        await manager.save(profile)
+        profile.media_preferences.series_quality = "1080p"
+        await manager.save(profile)
+        assert spy_save.await_count == 0
+        assert (await manager.get(313)).media_preferences.series_quality == "1080p"
+
+        await manager.close()
+
+    assert spy_save.await_count == 1
+    stored = await get_profile(test_db, user_id=313)
+    assert stored is not None
+    assert stored["media_preferences"] == {"movie_quality": "4k", "series_quality": "1080p"}
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_delayed_save_written_after_delay(test_db: Path) -> None:
+    """A delayed save is written in the background once save_delay elapses."""
+    import asyncio
+
+    manager = ProfileManager(test_db, save_delay=0.01)
+    await manager.save(_make_profile(user_id=315))
+    assert await get_profile(test_db, user_id=315) is None
+
+    await asyncio.sleep(0.05)
+    assert await get_profile(test_db, user_id=315) is not None
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_failed_delayed_write_stays_pending(test_db: Path) -> None:
+    """A failed delayed write keeps the change, raises from flush(), and is retried."""
+    from home_agent import profile as profile_module
+
+    manager = ProfileManager(test_db, save_delay=60.0)
+    await manager.save(_make_profile(user_id=316))
+    with patch.object(
+        profile_module, "save_profile", AsyncMock(side_effect=OSError("disk full"))
+    ), pytest.raises(OSError):
+        await manager.flush()
+
+    assert 316 in manager._pending
+    assert 316 in manager._flush_timers
+    await manager.close()
+    assert await get_profile(test_db, user_id=316) is not None
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_background_write_retried_after_failure(test_db: Path) -> None:
+    """A background write that fails is retried instead of being dropped."""
+    import asyncio
+
+    from home_agent import profile as profile_module
+
+    manager = ProfileManager(test_db, save_delay=0.01)
+    real_save = profile_module.save_profile
+    calls = 0
+
+    async def flaky_save(*args: object, **kwargs: object) -> None:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise OSError("locked")
+        await real_save(*args, **kwargs)
+
+    with patch.object(profile_module, "save_profile", flaky_save), \
+         patch.object(profile_module, "_SAVE_RETRY_DELAY", 0.01):
+        await manager.save(_make_profile(user_id=317))
+        await asyncio.sleep(0.1)
+
+    assert calls == 2
+    assert await get_profile(test_db, user_id=317) is not None
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_load_waits_for_in_flight_write(test_db: Path) -> None:
+    """A reload after eviction waits for the user's delayed write already in progress."""
+    import asyncio
+
+    from home_agent import profile as profile_module
+
+    manager = ProfileManager(test_db, save_delay=0.01)
+    real_save = profile_module.save_profile
+    release = asyncio.Event()
+
+    async def slow_save(*args: object, **kwargs: object) -> None:
+        await release.wait()
+        await real_save(*args, **kwargs)
+
+    profile = _make_profile(user_id=318)
+    profile.name = "Stored"
+    with patch.object(profile_module, "save_profile", slow_save):
+        await manager.save(profile)
+        await asyncio.sleep(0.05)  # the delayed write is now in flight
+        assert 318 in manager._flush_tasks
+        manager._cache.clear()
+        load = asyncio.ensure_future(manager.get(318))
+        await asyncio.sleep(0)
+        assert not load.done()
+        release.set()
+        loaded = await load
+
+    assert loaded.name == "Stored"
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_append_note_folds_into_pending_save(test_db: Path) -> None:
+    """append_note while a save is pending is written with that save, not lost."""
+    manager = ProfileManager(test_db, save_delay=60.0)
+    profile = _make_profile(user_id=314)
+    await manager.save(profile)
+    profile.notes.append("Likes horror")
+    await manager.append_note(profile, "Likes horror")
+    await manager.flush()
+
+    stored = await get_profile(test_db, user_id=314)
+    assert stored is not None
+    assert stored["notes"] == ["Likes horror"]
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_loads_stored_payload(test_db: Path) -> None:
+    """A stored payload loads with nested models built and missing timestamps filled."""
+    await save_profile(
+        test_db,
+        user_id=316,
+        data={"name": "Kim", "media_preferences": {"movie_quality": "4k"}},
+    )
+
+    profile = await ProfileManager(test_db).get(316)
+
+    assert profile.user_id == 316
+    assert profile.name == "Kim"
+    assert profile.media_preferences == MediaPreferences(movie_quality="4k")
+    assert profile.created_at.tzinfo is not None
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_cache_evicts_least_recently_used(test_db: Path) -> None:
+    """The profile cache is bounded and evicts the least recently used user."""
+    manager = ProfileManager(test_db)
+    with patch("home_agent.profile._PROFILE_CACHE_SIZE", 2):
+        await manager.get(1)
+        await manager.get(2)
+        await manager.get(1)  # 1 is now most recently used
+        await manager.get(3)
+
+    assert list(manager._cache) == [1, 3]
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_load_survives_eviction_during_save(test_db: Path) -> None:
+    """Loads that save return the stored profile even if it was already evicted."""
+    await ProfileManager(test_db).get(11)
+    manager = ProfileManager(test_db, admin_telegram_ids=[11])
+    # A zero-size cache evicts on insert, as if other users' loads pushed the
+    # entry out while the save awaited the database.
+    with patch("home_agent.profile._PROFILE_CACHE_SIZE", 0):
+        created = await manager.get(10)
+        promoted = await manager.get(11)
+
+    assert created.user_id == 10
+    assert promoted.role == "admin"
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_cached_profile_shares_no_mutable_fields(test_db: Path) -> None:
+    """Editing the saved instance afterwards does not leak into the cached profile."""
+    manager = ProfileManager(test_db)
+    profile = _make_profile(user_id=303)
+    await manager.save(profile)
+    profile.notes.append("stored")
+    await manager.append_note(profile, "stored")
+    profile.notes.append("unsaved")
+    profile.media_preferences.series_quality = "4k"
+
+    cached = await manager.get(303)
+    assert cached.notes == ["stored"]
+    assert cached.media_preferences.series_quality is None
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_save_stamps_updated_at_without_mutating(test_db: Path) -> None:
+    """save() stores a fresh updated_at and leaves the caller's profile untouched."""
+    manager = ProfileManager(test_db)
+    old = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    profile = UserProfile(user_id=302, created_at=old, updated_at=old)
+
+    await manager.save(profile)
+
+    assert profile.updated_at == old
+    stored = await get_profile(test_db, user_id=302)
+    assert stored is not None
+    assert "user_id" not in stored
+    assert UserProfile(user_id=302, **stored).updated_at > old
+
+
+@pytest.mark.asyncio
+async def test_profile_manager_append_note_saves_unstored_profile(test_db: Path) -> None:
+    """append_note falls back to a full save when no profile row exists yet."""
+    manager = ProfileManager(test_db)
+    profile = _make_profile(user_id=302)
+    profile.notes.append("New here")
+
+    await manager.append_note(profile, "New here")
+
+    reloaded = await manager.get(302)
+    assert reloaded.notes == ["New here"]
+
+
 @pytest.mark.asyncio
 async def test_profile_manager_custom_default_profile(test_db: Path) -> None:
     """ProfileManager uses a supplied default_profile template for new users."""
@@ -163,6 +455,22 @@ async def test_profile_manager_custom_default_profile(test_db: Path) -> None:
     assert profile.media_preferences.movie_quality == "4k"
 
 
+@pytest.mark.asyncio
+async def test_new_profiles_do_not_share_mutable_fields_with_template(test_db: Path) -> None:
+    """In-place edits to a new user's profile never leak into the default template."""
+    manager = ProfileManager(test_db)
+
+    first = await manager.get(556)
+    first.notes.append("Only about user 556")
+    first.media_preferences.movie_quality = "4k"
+
+    second = await manager.get(557)
+
+    assert second.notes == []
+    assert second.media_preferences.movie_quality is None
+    assert manager.default_profile.notes == []
+
+
 # ── Migration & new fields ────────────────────────────────────────────────────
 
 
@@ -8,13 +8,13 @@ from __future__ import annotations
 
 from datetime import datetime
 from pathlib import Path
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
-from pydantic_ai import RunContext
+from pydantic_ai import Agent, RunContext
 from pydantic_ai.models.test import TestModel
 
-from home_agent.agent import AgentDeps, create_agent
+from home_agent.agent import AgentDeps
 from home_agent.config import AppConfig
 from home_agent.history import HistoryManager
 from home_agent.profile import MediaPreferences, ProfileManager, UserProfile
@@ -120,6 +120,26 @@ async def test_set_movie_quality_updates_deps(
     assert ctx.deps.user_profile.media_preferences.movie_quality == "4k"
 
 
+@pytest.mark.asyncio
+async def test_set_movie_quality_failed_save_leaves_profile_unchanged(
+    mock_config: AppConfig, test_db: Path
+) -> None:
+    """If persisting fails, neither the run's profile nor the cached one changes."""
+    profile_manager = ProfileManager(test_db)
+    history_manager = HistoryManager(test_db)
+    await profile_manager.save(make_test_profile(user_id=44))
+    profile = await profile_manager.get(44)
+
+    ctx = make_mock_ctx(profile, profile_manager, mock_config, history_manager)
+    with patch("home_agent.profile.save_profile", AsyncMock(side_effect=OSError("locked"))):
+        with pytest.raises(OSError):
+            await set_movie_quality(ctx, "1080p")
+
+    assert ctx.deps.user_profile is profile
+    assert profile.media_preferences.movie_quality is None
+    assert (await profile_manager.get(44)).media_preferences.movie_quality is None
+
+
 # ---------------------------------------------------------------------------
 # set_series_quality
 # ---------------------------------------------------------------------------
@@ -235,7 +255,10 @@ async def test_set_confirmation_mode_always(
 
 @pytest.mark.asyncio
 async def test_profile_tools_registered_on_agent(
-    mock_config: AppConfig, test_db: Path
+    mock_config: AppConfig,
+    test_db: Path,
+    agent_instance: Agent[AgentDeps, str],
+    default_test_model: TestModel,
 ) -> None:
     """All 4 profile tools are registered on the agent."""
     profile_manager = ProfileManager(test_db)
@@ -248,14 +271,12 @@ async def test_profile_tools_registered_on_agent(
         user_profile=profile,
     )
 
-    agent_instance = create_agent()
-    m = TestModel()
-    with agent_instance.override(model=m):
-        async with agent_instance:
-            await agent_instance.run("hello", deps=deps)
+    with agent_instance.override(model=default_test_model):
+        await agent_instance.run("hello", deps=deps)
 
-    assert m.last_model_request_parameters is not None
-    tool_names = {t.name for t in m.last_model_request_parameters.function_tools}
+    params = default_test_model.last_model_request_parameters
+    assert params is not None
+    tool_names = {t.name for t in params.function_tools}
     assert "set_movie_quality" in tool_names
     assert "set_series_quality" in tool_names
     assert "set_reply_language" in tool_names
@@ -270,7 +291,9 @@ async def test_profile_tools_registered_on_agent(
 
 @pytest.mark.asyncio
 async def test_update_user_note_via_agent_run(
-    mock_config: AppConfig, test_db: Path
+    mock_config: AppConfig,
+    test_db: Path,
+    agent_instance: Agent[AgentDeps, str],
 ) -> None:
     """update_user_note tool saves to profile when triggered via agent.run()."""
     from unittest.mock import AsyncMock as _AsyncMock
@@ -289,18 +312,18 @@ async def test_update_user_note_via_agent_run(
         user_profile=profile,
     )
 
-    agent_instance = create_agent()
     m = TestModel(call_tools=["update_user_note"])
     with agent_instance.override(model=m):
-        async with agent_instance:
-            await agent_instance.run("remember something about me", deps=deps)
+        await agent_instance.run("remember something about me", deps=deps)
 
     profile_manager.save.assert_called()  # type: ignore[attr-defined]
 
 
 @pytest.mark.asyncio
 async def test_set_movie_quality_via_agent_run(
-    mock_config: AppConfig, test_db: Path
+    mock_config: AppConfig,
+    test_db: Path,
+    agent_instance: Agent[AgentDeps, str],
 ) -> None:
     """set_movie_quality tool updates user_profile when triggered via agent.run()."""
     profile_manager = ProfileManager(test_db)
@@ -315,11 +338,9 @@ async def test_set_movie_quality_via_agent_run(
         user_profile=profile,
     )
 
-    agent_instance = create_agent()
     m = TestModel(call_tools=["set_movie_quality"])
     with agent_instance.override(model=m):
-        async with agent_instance:
-            await agent_instance.run("set my movie quality to 4k", deps=deps)
+        await agent_instance.run("set my movie quality to 4k", deps=deps)
 
     # TestModel supplies a str arg; the tool must have run without error
     # and the profile_manager should have been called to save
@@ -330,7 +351,9 @@ async def test_set_movie_quality_via_agent_run(
 
 @pytest.mark.asyncio
 async def test_set_series_quality_via_agent_run(
-    mock_config: AppConfig, test_db: Path
+    mock_config: AppConfig,
+    test_db: Path,
+    agent_instance: Agent[AgentDeps, str],
 ) -> None:
     """set_series_quality tool runs without error when triggered via agent.run()."""
     profile_manager = ProfileManager(test_db)
@@ -345,18 +368,18 @@ async def test_set_series_quality_via_agent_run(
         user_profile=profile,
     )
 
-    agent_instance = create_agent()
     m = TestModel(call_tools=["set_series_quality"])
     with agent_instance.override(model=m):
-        async with agent_instance:
-            result = await agent_instance.run("set my series quality", deps=deps)
+        result = await agent_instance.run("set my series quality", deps=deps)
 
     assert result.output is not None
 
 
 @pytest.mark.asyncio
 async def test_set_reply_language_via_agent_run(
-    mock_config: AppConfig, test_db: Path
+    mock_config: AppConfig,
+    test_db: Path,
+    agent_instance: Agent[AgentDeps, str],
 ) -> None:
     """set_reply_language tool persists change when triggered via agent.run()."""
     from unittest.mock import AsyncMock as _AsyncMock
@@ -374,18 +397,18 @@ async def test_set_reply_language_via_agent_run(
         user_profile=profile,
     )
 
-    agent_instance = create_agent()
     m = TestModel(call_tools=["set_reply_language"])
     with agent_instance.override(model=m):
-        async with agent_instance:
-            await agent_instance.run("reply to me in Dutch", deps=deps)
+        await agent_instance.run("reply to me in Dutch", deps=deps)
 
     profile_manager.save.assert_called()  # type: ignore[attr-defined]
 
 
 @pytest.mark.asyncio
 async def test_set_confirmation_mode_via_agent_run(
-    mock_config: AppConfig, test_db: Path
+    mock_config: AppConfig,
+    test_db: Path,
+    agent_instance: Agent[AgentDeps, str],
 ) -> None:
     """set_confirmation_mode tool persists change when triggered via agent.run()."""
     from unittest.mock import AsyncMock as _AsyncMock
@@ -403,11 +426,9 @@ async def test_set_confirmation_mode_via_agent_run(
         user_profile=profile,
     )
 
-    agent_instance = create_agent()
     m = TestModel(call_tools=["set_confirmation_mode"])
     with agent_instance.override(model=m):
-        async with agent_instance:
-            await agent_instance.run("don't ask me to confirm", deps=deps)
+        await agent_instance.run("don't ask me to confirm", deps=deps)
 
     profile_manager.save.assert_called()  # type: ignore[attr-defined]
 
@@ -0,0 +1,126 @@
+"""Tests for src/home_agent/models/rate_limit.py."""
+
+from __future__ import annotations
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from home_agent.models.rate_limit import TokenBucket
+
+
+class _FakeClock:
+    """Monotonic clock that only advances when the patched sleep is awaited."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+async def test_acquire_within_capacity_does_not_wait() -> None:
+    """A full bucket serves up to capacity acquires immediately."""
+    clock = _FakeClock()
+    with patch("home_agent.models.rate_limit.time.monotonic", clock.monotonic), \
+         patch("home_agent.models.rate_limit.asyncio.sleep", clock.sleep):
+        bucket = TokenBucket(capacity=3, refill_rate=1.0)
+        for _ in range(3):
+            await bucket.acquire()
+
+    assert clock.sleeps == []
+    assert bucket.tokens == pytest.approx(0.0)
+
+
+async def test_acquire_waits_for_refill_when_empty() -> None:
+    """An empty bucket sleeps just long enough for one token to refill."""
+    clock = _FakeClock()
+    with patch("home_agent.models.rate_limit.time.monotonic", clock.monotonic), \
+         patch("home_agent.models.rate_limit.asyncio.sleep", clock.sleep):
+        bucket = TokenBucket.per_minute(2)  # burst 2, one token every 30s
+        await bucket.acquire()
+        await bucket.acquire()
+        await bucket.acquire()
+
+    assert clock.sleeps == [pytest.approx(30.0)]
+
+
+async def test_per_minute_fractional_rate_still_admits_one_request() -> None:
+    """per_minute() keeps a burst of at least one so acquire() can succeed."""
+    bucket = TokenBucket.per_minute(0.5)
+    assert bucket.capacity == 1.0
+    await bucket.acquire()
+
+
+def test_invalid_rate_rejected() -> None:
+    """A non-positive capacity or refill rate raises ValueError."""
+    with pytest.raises(ValueError):
+        TokenBucket(capacity=0, refill_rate=1.0)
+    with pytest.raises(ValueError):
+        TokenBucket(capacity=1, refill_rate=0.0)
+
+
+async def test_retrying_model_acquires_before_each_attempt() -> None:
+    """RetryingModel takes a token before the first attempt and every retry."""
+    from pydantic_ai.exceptions import ModelHTTPError
+    from pydantic_ai.messages import ModelResponse, TextPart
+    from pydantic_ai.models import Model
+
+    from home_agent.models.retry_model import RetryingModel
+
+    inner = MagicMock(spec=Model)
+    inner.model_name = "test-model"
+    inner.system = "test"
+    good_response = ModelResponse(parts=[TextPart(content="ok")], model_name="test-model")
+    inner.request = AsyncMock(
+        side_effect=[ModelHTTPError(status_code=429, model_name="test-model"), good_response]
+    )
+    limiter = MagicMock(spec=TokenBucket)
+    limiter.acquire = AsyncMock()
+
+    model = RetryingModel(inner, max_retries=3, base_delay=0.0, rate_limiter=limiter)
+    with patch("home_agent.models.retry_model.asyncio.sleep", new_callable=AsyncMock):
+        result = await model.request([], None, MagicMock())
+
+    assert result is good_response
+    assert limiter.acquire.await_count == 2
+    limiter.on_throttled.assert_called_once_with(None)
+    limiter.on_success.assert_called_once_with()
+
+
+def test_on_throttled_halves_rate_down_to_min() -> None:
+    """Each 429 multiplies the refill rate by decrease_factor, floored at min_rate."""
+    bucket = TokenBucket(capacity=5, refill_rate=1.0, min_rate=0.3)
+    bucket.on_throttled()
+    assert bucket.refill_rate == pytest.approx(0.5)
+    bucket.on_throttled()
+    assert bucket.refill_rate == pytest.approx(0.3)
+
+
+def test_on_success_recovers_rate_up_to_max() -> None:
+    """Successes add increase_step back, capped at the initial rate."""
+    bucket = TokenBucket(capacity=5, refill_rate=1.0, increase_step=0.2)
+    bucket.on_throttled()
+    bucket.on_success()
+    assert bucket.refill_rate == pytest.approx(0.7)
+    for _ in range(5):
+        bucket.on_success()
+    assert bucket.refill_rate == pytest.approx(1.0)
+
+
+async def test_retry_after_holds_bucket_empty() -> None:
+    """on_throttled(retry_after) empties the bucket until the server's reset."""
+    clock = _FakeClock()
+    with patch("home_agent.models.rate_limit.time.monotonic", clock.monotonic), \
+         patch("home_agent.models.rate_limit.asyncio.sleep", clock.sleep):
+        bucket = TokenBucket(capacity=5, refill_rate=1.0, min_rate=1.0)
+        bucket.on_throttled(retry_after=10.0)
+        await bucket.acquire()
+
+    # 10s held empty by the server hint, then 1s to refill one token.
+    assert sum(clock.sleeps) == pytest.approx(11.0)
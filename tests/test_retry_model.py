@@ -5,9 +5,11 @@ from __future__ import annotations
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from pydantic_ai import Agent
 from pydantic_ai.exceptions import ModelHTTPError
 from pydantic_ai.messages import ModelResponse, TextPart
 
+from home_agent.agent import AgentDeps
 from home_agent.models.retry_model import RetryingModel
 
 
@@ -41,6 +43,26 @@ def make_429_error() -> ModelHTTPError:
     return ModelHTTPError(status_code=429, model_name="test-model", body={"message": "rate limited"})
 
 
+def make_429_error_with_headers(headers: dict[str, str]) -> ModelHTTPError:
+    """Create a 429 ModelHTTPError chained from an SDK error carrying headers.
+
+    Mirrors how provider models raise ``ModelHTTPError(...) from e``.
+
+    Args:
+        headers: Response headers to attach to the underlying SDK error.
+
+    Returns:
+        A ModelHTTPError with status_code=429 and ``__cause__.response.headers``.
+    """
+    import httpx
+
+    exc = make_429_error()
+    cause = Exception("sdk error")
+    cause.response = httpx.Response(429, headers=headers)  # type: ignore[attr-defined]
+    exc.__cause__ = cause
+    return exc
+
+
 def make_500_error() -> ModelHTTPError:
     """Create a 500 ModelHTTPError for testing.
 
@@ -73,7 +95,7 @@ async def test_retries_on_429_then_succeeds() -> None:
     good_response = ModelResponse(parts=[TextPart(content="ok")], model_name="test-model")
     inner.request = AsyncMock(side_effect=[make_429_error(), good_response])
 
-    model = RetryingModel(inner, max_retries=3, base_delay=1.0)
+    model = RetryingModel(inner, max_retries=3, base_delay=1.0, jitter="none")
 
     with patch("home_agent.models.retry_model.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
         result = await model.request([], None, MagicMock())
@@ -95,7 +117,7 @@ async def test_exponential_backoff_delays() -> None:
         side_effect=[make_429_error(), make_429_error(), make_429_error(), good_response]
     )
 
-    model = RetryingModel(inner, max_retries=3, base_delay=1.0)
+    model = RetryingModel(inner, max_retries=3, base_delay=1.0, jitter="none")
 
     with patch("home_agent.models.retry_model.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
         result = await model.request([], None, MagicMock())
@@ -154,7 +176,10 @@ async def test_delay_capped_at_max_delay() -> None:
     inner.system = "test"
     inner.request = AsyncMock(side_effect=make_429_error())
 
-    model = RetryingModel(inner, max_retries=4, base_delay=10.0, max_delay=15.0)
+    model = RetryingModel(
+        inner, max_retries=4, base_delay=10.0, max_delay=15.0,
+        max_total_wait=100.0, jitter="none",
+    )
 
     sleep_calls: list[float] = []
 
@@ -169,6 +194,118 @@ async def test_delay_capped_at_max_delay() -> None:
     assert sleep_calls == [10.0, 15.0, 15.0, 15.0]
 
 
+async def test_total_backoff_capped_by_max_total_wait() -> None:
+    """Retries stop once the next sleep would push total backoff past max_total_wait."""
+    from pydantic_ai.models import Model
+
+    inner = MagicMock(spec=Model)
+    inner.model_name = "test-model"
+    inner.system = "test"
+    inner.request = AsyncMock(side_effect=make_429_error())
+
+    model = RetryingModel(
+        inner, max_retries=6, base_delay=1.0, max_delay=30.0,
+        max_total_wait=10.0, jitter="none",
+    )
+
+    with patch("home_agent.models.retry_model.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        with pytest.raises(ModelHTTPError):
+            await model.request([], None, MagicMock())
+
+    # 1 + 2 + 4 = 7s slept; the next 8s sleep would exceed the 10s budget.
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [1.0, 2.0, 4.0]
+    assert inner.request.call_count == 4
+
+
+async def test_retry_after_header_extends_delay() -> None:
+    """A Retry-After hint longer than the backoff delay is honoured."""
+    from pydantic_ai.models import Model
+
+    inner = MagicMock(spec=Model)
+    inner.model_name = "test-model"
+    inner.system = "test"
+    good_response = ModelResponse(parts=[TextPart(content="ok")], model_name="test-model")
+    inner.request = AsyncMock(
+        side_effect=[make_429_error_with_headers({"Retry-After": "7"}), good_response]
+    )
+
+    model = RetryingModel(inner, max_retries=3, base_delay=1.0, max_delay=30.0)
+
+    with patch("home_agent.models.retry_model.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        await model.request([], None, MagicMock())
+
+    mock_sleep.assert_called_once_with(7.0)
+
+
+async def test_ratelimit_reset_header_is_capped_at_max_delay() -> None:
+    """An X-RateLimit-Reset epoch (milliseconds) far in the future is capped at max_delay."""
+    import time
+
+    from pydantic_ai.models import Model
+
+    inner = MagicMock(spec=Model)
+    inner.model_name = "test-model"
+    inner.system = "test"
+    good_response = ModelResponse(parts=[TextPart(content="ok")], model_name="test-model")
+    reset_ms = str(int((time.time() + 600) * 1000))
+    inner.request = AsyncMock(
+        side_effect=[make_429_error_with_headers({"X-RateLimit-Reset": reset_ms}), good_response]
+    )
+
+    model = RetryingModel(inner, max_retries=3, base_delay=1.0, max_delay=20.0)
+
+    with patch("home_agent.models.retry_model.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        await model.request([], None, MagicMock())
+
+    mock_sleep.assert_called_once_with(20.0)
+
+
+async def test_far_future_reset_holds_rate_limiter_at_most_max_delay() -> None:
+    """A daily-quota reset hours away holds the shared bucket for at most max_delay."""
+    import time
+
+    from pydantic_ai.models import Model
+
+    from home_agent.models.rate_limit import TokenBucket
+
+    inner = MagicMock(spec=Model)
+    inner.model_name = "test-model"
+    inner.system = "test"
+    reset_s = str(int(time.time() + 6 * 3600))
+    inner.request = AsyncMock(side_effect=make_429_error_with_headers({"X-RateLimit-Reset": reset_s}))
+    limiter = MagicMock(spec=TokenBucket)
+    limiter.acquire = AsyncMock()
+
+    model = RetryingModel(inner, max_retries=0, max_delay=20.0, rate_limiter=limiter)
+
+    with pytest.raises(ModelHTTPError):
+        await model.request([], None, MagicMock())
+
+    limiter.on_throttled.assert_called_once_with(20.0)
+
+
+@pytest.mark.parametrize("value", ["inf", "nan"])
+async def test_non_finite_retry_after_is_ignored(value: str) -> None:
+    """Retry-After: inf/nan is not a usable hint and never reaches the rate limiter."""
+    from pydantic_ai.models import Model
+
+    from home_agent.models.rate_limit import TokenBucket
+
+    inner = MagicMock(spec=Model)
+    inner.model_name = "test-model"
+    inner.system = "test"
+    inner.request = AsyncMock(side_effect=make_429_error_with_headers({"Retry-After": value}))
+    limiter = MagicMock(spec=TokenBucket)
+    limiter.acquire = AsyncMock()
+
+    model = RetryingModel(inner, max_retries=0, rate_limiter=limiter)
+
+    with pytest.raises(ModelHTTPError):
+        await model.request([], None, MagicMock())
+
+    limiter.on_throttled.assert_called_once_with(None)
+
+
 async def test_on_retry_callback_invoked() -> None:
     """The on_retry callback is called with attempt index and wait_seconds."""
     from pydantic_ai.models import Model
@@ -180,7 +317,9 @@ async def test_on_retry_callback_invoked() -> None:
     inner.request = AsyncMock(side_effect=[make_429_error(), make_429_error(), good_response])
 
     on_retry = AsyncMock()
-    model = RetryingModel(inner, max_retries=3, base_delay=2.0, on_retry=on_retry)
+    model = RetryingModel(
+        inner, max_retries=3, base_delay=2.0, jitter="none", on_retry=on_retry
+    )
 
     with patch("home_agent.models.retry_model.asyncio.sleep", new_callable=AsyncMock):
         await model.request([], None, MagicMock())
@@ -190,14 +329,144 @@ async def test_on_retry_callback_invoked() -> None:
     on_retry.assert_any_call(1, 4.0)
 
 
+@pytest.mark.parametrize(
+    ("jitter", "low", "high"),
+    [("full", 0.0, 4.0), ("equal", 2.0, 4.0)],
+)
+async def test_jitter_bounds_wait(jitter: str, low: float, high: float) -> None:
+    """Jittered waits stay within the mode's range and are passed to on_retry."""
+    from pydantic_ai.models import Model
+
+    inner = MagicMock(spec=Model)
+    inner.model_name = "test-model"
+    inner.system = "test"
+    inner.request = AsyncMock(side_effect=make_429_error())
+
+    on_retry = AsyncMock()
+    model = RetryingModel(
+        inner, max_retries=20, base_delay=4.0, max_delay=4.0, max_total_wait=1000.0,
+        jitter=jitter, on_retry=on_retry,  # type: ignore[arg-type]
+    )
+
+    with patch("home_agent.models.retry_model.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        with pytest.raises(ModelHTTPError):
+            await model.request([], None, MagicMock())
+
+    waits = [call.args[0] for call in mock_sleep.call_args_list]
+    assert len(waits) == 20
+    assert all(low <= w <= high for w in waits)
+    assert len(set(waits)) > 1
+    assert [call.args[1] for call in on_retry.call_args_list] == waits
+
+
+async def test_max_concurrency_caps_in_flight_requests() -> None:
+    """No more than max_concurrency inner requests run at the same time."""
+    import asyncio
+
+    from pydantic_ai.models import Model
+
+    in_flight = 0
+    peak = 0
+    good_response = ModelResponse(parts=[TextPart(content="ok")], model_name="test-model")
+
+    async def slow_request(*_: object) -> ModelResponse:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return good_response
+
+    inner = MagicMock(spec=Model)
+    inner.model_name = "test-model"
+    inner.system = "test"
+    inner.request = slow_request
+
+    model = RetryingModel(inner, max_concurrency=2)
+    results = await asyncio.gather(*(model.request([], None, MagicMock()) for _ in range(6)))
+
+    assert all(r is good_response for r in results)
+    assert peak == 2
+
+
+def make_stream_inner(failures: list[Exception]) -> tuple[MagicMock, MagicMock]:
+    """Create a mock inner model whose request_stream fails to open, then succeeds.
+
+    Args:
+        failures: Errors raised on successive opens before one succeeds.
+
+    Returns:
+        The inner model mock and the stream object it eventually yields.
+    """
+    from contextlib import asynccontextmanager
+
+    from pydantic_ai.models import Model
+
+    stream = MagicMock()
+    remaining = list(failures)
+    inner = MagicMock(spec=Model)
+    inner.model_name = "test-model"
+    inner.system = "test"
+    inner.opens = 0
+
+    @asynccontextmanager
+    async def request_stream(*_: object):
+        inner.opens += 1
+        if remaining:
+            raise remaining.pop(0)
+        yield stream
+
+    inner.request_stream = request_stream
+    return inner, stream
+
+
+async def test_request_stream_retries_429_before_first_chunk() -> None:
+    """A 429 while opening the stream is retried; the caller gets the next stream."""
+    inner, stream = make_stream_inner([make_429_error()])
+    model = RetryingModel(inner, max_retries=3, base_delay=1.0, jitter="none")
+
+    with patch("home_agent.models.retry_model.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        async with model.request_stream([], None, MagicMock()) as opened:
+            assert opened is stream
+
+    assert inner.opens == 2
+    mock_sleep.assert_called_once_with(1.0)
+
+
+async def test_request_stream_non_429_not_retried() -> None:
+    """Non-429 errors while opening the stream propagate immediately."""
+    inner, _ = make_stream_inner([make_500_error()])
+    model = RetryingModel(inner, max_retries=3, base_delay=1.0)
+
+    with pytest.raises(ModelHTTPError) as exc_info:
+        async with model.request_stream([], None, MagicMock()):
+            pass
+
+    assert exc_info.value.status_code == 500
+    assert inner.opens == 1
+
+
+async def test_request_stream_error_after_yield_not_retried() -> None:
+    """Errors raised after the stream was handed to the caller are not replayed."""
+    inner, _ = make_stream_inner([])
+    model = RetryingModel(inner, max_retries=3, base_delay=1.0)
+
+    with pytest.raises(ModelHTTPError):
+        async with model.request_stream([], None, MagicMock()):
+            raise make_429_error()
+
+    assert inner.opens == 1
+
+
 @pytest.mark.asyncio
-async def test_retrying_model_works_through_real_agent() -> None:
+async def test_retrying_model_works_through_real_agent(
+    agent_instance: Agent[AgentDeps, str],
+) -> None:
     """RetryingModel satisfies PydanticAI Model protocol when used with a real Agent."""
     from datetime import datetime
 
     from pydantic_ai.models.test import TestModel
 
-    from home_agent.agent import AgentDeps, create_agent
     from home_agent.models.retry_model import RetryingModel
     from home_agent.profile import MediaPreferences, UserProfile
 
@@ -205,8 +474,6 @@ async def test_retrying_model_works_through_real_agent() -> None:
     inner = TestModel()
     retrying = RetryingModel(inner, max_retries=1, base_delay=0.0, max_delay=0.0)
 
-    agent_instance = create_agent()
-
     profile = UserProfile(
         user_id=1,
         created_at=datetime.now(),
@@ -131,6 +131,40 @@ async def test_typing_indicator_shown(
     update.effective_chat.send_action.assert_called_once_with(action=ChatAction.TYPING)
 
 
+@pytest.mark.asyncio
+async def test_typing_indicator_failure_does_not_block_transcription(
+    mock_config: AppConfig, test_db: Path
+) -> None:
+    """A failing typing indicator runs in the background and never blocks the reply."""
+    profile_manager = ProfileManager(test_db)
+    history_manager = HistoryManager(test_db)
+
+    mock_result = MagicMock()
+    mock_result.output = "On it!"
+    mock_agent = MagicMock()
+    mock_agent.run = AsyncMock(return_value=mock_result)
+
+    handler = make_voice_handler(mock_config, profile_manager, history_manager, mock_agent)
+    update, context = make_voice_update(user_id=123)
+    update.effective_chat.send_action = AsyncMock(side_effect=RuntimeError("telegram down"))
+
+    mock_response = MagicMock()
+    mock_response.json.return_value = {"text": "play Inception"}
+    mock_response.raise_for_status = MagicMock()
+
+    with patch("home_agent.bot.httpx.AsyncClient") as mock_client_cls:
+        mock_client = AsyncMock()
+        mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+        mock_client.__aexit__ = AsyncMock(return_value=None)
+        mock_client.post = AsyncMock(return_value=mock_response)
+        mock_client_cls.return_value = mock_client
+
+        await handler(update, context)
+
+    mock_agent.run.assert_called_once()
+    update.message.reply_text.assert_called_once()
+
+
 @pytest.mark.asyncio
 async def test_ogg_bytes_posted_to_asr_url(
     mock_config: AppConfig, test_db: Path